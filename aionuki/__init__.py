@@ -1,4 +1,9 @@
 from .bridge import NukiBridge
+from .callback import NukiCallbackServer
+from .fleet import NukiFleet
 from .constants import *
 from .lock import NukiLock
-from .opener import NukiOpener
\ No newline at end of file
+from .metrics import MetricsCollector, RequestHooks
+from .opener import NukiOpener
+from .snapshot import load_snapshot, save_snapshot
+from .state import DeviceType, DoorSensorState, LockState, OpenerState
\ No newline at end of file
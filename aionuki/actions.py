@@ -0,0 +1,254 @@
+# coding: utf-8
+
+import asyncio
+import time
+from collections import namedtuple
+
+from . import constants as const
+from .events import SOURCE_LIST
+from .exceptions import NukiActionException, NukiActionTimeoutException
+from .utils import logger
+
+# Default values, in seconds
+ACTION_TIMEOUT = 30
+# While waiting and no callback arrived, /list is refreshed after
+# ACTION_FIRST_POLL, then twice as late every time, up to ACTION_POLL_INTERVAL
+ACTION_FIRST_POLL = 0.25
+ACTION_POLL_INTERVAL = 3
+# Actions of a bulk operation in flight per bridge. The bridge talks to one
+# device at a time over BLE, a longer backlog only makes requests time out.
+BULK_CONCURRENCY = 2
+
+# The action is complete once field changes to one of the target values, or
+# a /list refresh shows a target value set after the action was sent, as the
+# transitional states may be missed between two refreshes. Targets include the
+# state devices rest in afterwards, eg: unlocked after unlatching. Actions that
+# are idempotent are complete right away if the field already matches.
+Expectation = namedtuple("Expectation", ["field", "targets", "idempotent"])
+
+EXPECTATIONS = {
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_UNLOCK): Expectation(
+        "state", (const.STATE_LOCK_UNLOCKED,), True
+    ),
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_LOCK): Expectation(
+        "state", (const.STATE_LOCK_LOCKED,), True
+    ),
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_UNLATCH): Expectation(
+        "state", (const.STATE_LOCK_UNLATCHED, const.STATE_LOCK_UNLOCKED), False
+    ),
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_LOCK_N_GO): Expectation(
+        "state", (const.STATE_LOCK_UNLOCKED_LOCK_N_GO, const.STATE_LOCK_LOCKED), False
+    ),
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_LOCK_N_GO_WITH_UNLATCH): Expectation(
+        "state", (const.STATE_LOCK_UNLOCKED_LOCK_N_GO, const.STATE_LOCK_LOCKED), False
+    ),
+    (const.DEVICE_TYPE_OPENER, const.ACTION_OPENER_ACTIVATE_RTO): Expectation(
+        "state", (const.STATE_OPENER_RTO_ACTIVE,), True
+    ),
+    (const.DEVICE_TYPE_OPENER, const.ACTION_OPENER_DEACTIVATE_RTO): Expectation(
+        "state", (const.STATE_OPENER_ONLINE,), True
+    ),
+    (
+        const.DEVICE_TYPE_OPENER,
+        const.ACTION_OPENER_ELECTRIC_STRIKE_ACTUATION,
+    ): Expectation(
+        "state",
+        (
+            const.STATE_OPENER_OPENING,
+            const.STATE_OPENER_OPEN,
+            const.STATE_OPENER_ONLINE,
+        ),
+        False,
+    ),
+    (const.DEVICE_TYPE_OPENER, const.ACTION_OPENER_ACTIVATE_CONTINUOUS): Expectation(
+        "mode", (const.MODE_OPENER_CONTINUOUS,), True
+    ),
+    (const.DEVICE_TYPE_OPENER, const.ACTION_OPENER_DEACTIVATE_CONTINUOUS): Expectation(
+        "mode", (const.MODE_OPENER_DOOR,), True
+    ),
+}
+
+# States in which an action can't complete anymore
+FAILURE_STATES = {
+    const.DEVICE_TYPE_LOCK: (const.STATE_LOCK_MOTOR_BLOCKED,),
+}
+
+
+class ActionTracker(object):
+    """
+    Sends actions without blocking the bridge (noWait=1) and waits for the
+    resulting state change to arrive through callbacks or /list refreshes.
+    """
+
+    def __init__(
+        self,
+        bridge,
+        timeout=ACTION_TIMEOUT,
+        poll_interval=ACTION_POLL_INTERVAL,
+        first_poll=ACTION_FIRST_POLL,
+    ):
+        self.bridge = bridge
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.first_poll = first_poll
+
+    @staticmethod
+    def can_track(device, action):
+        return (device.device_type, action) in EXPECTATIONS
+
+    def start(self, device, action, timeout=None):
+        """Send the action and return a future resolving once it completed."""
+        return asyncio.ensure_future(self.run(device, action, timeout))
+
+    async def run(self, device, action, timeout=None):
+        """
+        Send the action and wait for its completion.
+        Returns the bridge response to the action.
+        """
+        expectation = EXPECTATIONS[(device.device_type, action)]
+        failures = FAILURE_STATES.get(device.device_type, ())
+        done = asyncio.get_event_loop().create_future()
+
+        def check(event):
+            if done.done():
+                return
+            value = event.changes.get(expectation.field)
+            if value in expectation.targets:
+                done.set_result(event)
+            elif event.changes.get("state") in failures:
+                done.set_exception(
+                    NukiActionException(
+                        f"Action {action} failed on {device}: {device.state_name}"
+                    )
+                )
+
+        # Subscribe first, the callback may arrive before the response
+        unsubscribe = device.events.subscribe(check)
+        # The bridge's timestamps have a one second resolution
+        started = self.bridge.now().replace(microsecond=0)
+        try:
+            res = await self.bridge.lock_action(
+                device.nuki_id, action, device_type=device.device_type, block=False
+            )
+            if not res.get("success", False):
+                return res
+            current = device._state.get(expectation.field)
+            if expectation.idempotent and current in expectation.targets:
+                return res
+
+            try:
+                await asyncio.wait_for(
+                    self._wait(done, device, expectation, started),
+                    self.timeout if timeout is None else timeout,
+                )
+            except asyncio.TimeoutError:
+                raise NukiActionTimeoutException(
+                    f"Action {action} on {device} did not complete in time"
+                )
+            return res
+        finally:
+            unsubscribe()
+            # Don't leave a failure unretrieved when returning early
+            if done.done():
+                done.exception()
+
+    async def _wait(self, done, device, expectation, started):
+        delay = min(self.first_poll, self.poll_interval)
+        while not done.done():
+            await asyncio.wait([done], timeout=delay)
+            if done.done():
+                break
+            delay = min(delay * 2, self.poll_interval)
+            # No callback yet, look at the bridge's last known state, not at a
+            # cached one from the previous check
+            self.bridge.cache.invalidate("list")
+            try:
+                await self.bridge.refresh_devices()
+            except Exception as err:
+                logger.warning(f"Refresh while waiting for action failed: {err!r}")
+                continue
+            if (
+                not done.done()
+                and device.state_source == SOURCE_LIST
+                and device.state_timestamp is not None
+                and device.state_timestamp >= started
+                and device._state.get(expectation.field) in expectation.targets
+            ):
+                # eg: locked again after a lock'n'go, which started locked
+                return None
+        return done.result()
+
+
+class ActionResult(
+    namedtuple("ActionResult", ["device", "action", "response", "error", "duration"])
+):
+    """Outcome of one action of a bulk operation, duration is in seconds"""
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None and bool(
+            self.response and self.response.get("success")
+        )
+
+
+class BulkResult(object):
+    """Per device outcomes of a bulk operation"""
+
+    def __init__(self, results=None):
+        self.results = list(results or [])
+        # bridgeId -> exception, for bridges whose devices couldn't be listed
+        self.errors = {}
+
+    def __repr__(self):
+        return f"<BulkResult: {len(self.succeeded)}/{len(self.results)} succeeded>"
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    @property
+    def ok(self):
+        return not self.errors and all(r.ok for r in self.results)
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def duration(self):
+        return max((r.duration for r in self.results), default=0)
+
+    def extend(self, other):
+        self.results.extend(other.results)
+        self.errors.update(other.errors)
+
+
+async def run_bulk(bridge, devices, action, wait=False, concurrency=BULK_CONCURRENCY):
+    """
+    Run action on devices of bridge, at most concurrency at a time. With wait,
+    every action is followed up to its final state, see ActionTracker.
+    Failures are reported in the result, they never abort the other actions.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(device):
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                res = await bridge.lock_action(
+                    device.nuki_id, action, device_type=device.device_type, block=wait
+                )
+            except Exception as err:
+                logger.warning(f"Action {action} failed on {device}: {err!r}")
+                return ActionResult(device, action, None, err, time.monotonic() - start)
+            return ActionResult(device, action, res, None, time.monotonic() - start)
+
+    return BulkResult(await asyncio.gather(*[run(dev) for dev in devices]))
@@ -9,18 +9,56 @@ import logging
 
 import asyncio
 import aiohttp
+import time
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 from functools import partial
 
 from . import constants as const
-from .device import NukiDevice
+from . import discovery
+from .actions import BULK_CONCURRENCY, ActionTracker, run_bulk
+from .cache import ResponseCache
+from .discovery import DISCOVERY_CACHE_TTL
+from .events import EventEmitter, SOURCE_CALLBACK
+from .freshness import AGGRESSIVE_AUTO, FreshnessPolicy
 from .lock import NukiLock
+from .metrics import RequestContext
+from .poller import AdaptivePoller
 from .opener import NukiOpener
-from .utils import hash_token, logger
-from .exceptions import BridgeUninitializedException, InvalidCredentialsException
+from .registry import DeviceRegistry, flatten_list_entry
+from .retry import (
+    CircuitBreaker,
+    RetryPolicy,
+    IDEMPOTENT_ENDPOINTS,
+    is_bridge_failure,
+)
+from .scheduler import (
+    RequestScheduler,
+    PRIORITY_ACTION,
+    PRIORITY_DEFAULT,
+    PRIORITY_POLL,
+)
+from .signing import RequestBuilder
+from .telemetry import BRIDGE_METRICS, Telemetry
+from .utils import logger, parse_timestamp
+from .exceptions import (
+    BridgeUnavailableException,
+    BridgeUninitializedException,
+    InvalidCredentialsException,
+)
 
 # Default values
 REQUESTS_TIMEOUT = 5
+# Extra time concurrent device refreshes wait to join a single /list request
+REFRESH_WINDOW = 0
+# Clock offset change in seconds worth retrying a request rejected with 401
+CLOCK_RESYNC_THRESHOLD = 2
+# The bridge returns at most 100 log entries per request
+LOG_PAGE_SIZE = 100
+# Callback urls a bridge can hold
+CALLBACK_LIMIT = 3
 
 
 class NukiBridge(object):
@@ -32,19 +70,66 @@ class NukiBridge(object):
         token=None,
         secure=True,
         timeout=REQUESTS_TIMEOUT,
+        refresh_window=REFRESH_WINDOW,
+        concurrency=1,
+        min_interval=0,
+        track_actions=True,
+        read_retry=None,
+        action_retry=None,
+        breaker=None,
+        cache_ttls=None,
+        hooks=None,
+        freshness=None,
+        telemetry=False,
     ):
         self.hostname = hostname
         self.port = port
-        self.__api_url = f"http://{hostname}:{port}"
         self.secure = secure
         self.requests_timeout = timeout
         self.auth_timeout = 30  # The bridge times out in 30s https://developer.nuki.io/page/nuki-bridge-http-api-1-12/4/#heading--auth
         self._json = None
         self.token = token
+        # Signs and builds the request urls, see _request_builder
+        self._builder = RequestBuilder(
+            f"http://{hostname}:{port}", token, secure, clock=self.timestamp
+        )
+        # Seconds the bridge's clock is ahead of ours, measured from /info's
+        # currentTime and the Date header of rejected requests
+        self.clock_offset = 0
 
         self.session = session
-
-        self.managedDevices = None  # []
+        # The bridge handles one request at a time, queue them client side
+        self.scheduler = RequestScheduler(concurrency, min_interval)
+        self.read_retry = read_retry or RetryPolicy()
+        self.action_retry = action_retry or RetryPolicy(attempts=2)
+        self.breaker = breaker or CircuitBreaker()
+        # See cache.DEFAULT_TTLS
+        self.cache = ResponseCache(cache_ttls)
+        # See metrics.RequestHooks
+        self.hooks = list(hooks or [])
+        # Local mirror of the bridge's callbacks, see _callback_entries
+        self._callbacks = None
+        # Default FreshnessPolicy of the devices, rations lockState queries
+        self.freshness = freshness or FreshnessPolicy()
+        # Health metrics of the bridge, and of the devices when enabled
+        self.telemetry = Telemetry(BRIDGE_METRICS) if telemetry else None
+
+        self.registry = DeviceRegistry(self)
+        # State changes of every managed device
+        self.events = EventEmitter()
+        self.refresh_window = refresh_window
+        self._refresh_future = None
+        # time.monotonic() of the last /list reconciliation
+        self.last_refresh = None
+
+        # time.monotonic() of the last received callback and sent action
+        self.last_callback = None
+        self.last_action = None
+        self.poller = None
+
+        # Wait for blocking actions through state changes instead of noWait=0
+        self.track_actions = track_actions
+        self.actions = ActionTracker(self)
 
     def __repr__(self):
         return f"<NukiBridge: {self.hostname}:{self.port} (token={self.token})>"
@@ -66,36 +151,52 @@ class NukiBridge(object):
         await self.endSession(type, value, traceback)
 
     @staticmethod
-    async def discover():
-        # Use a sepparate session, doesn't make sense to use the cloud session for local reqs
-        async with aiohttp.ClientSession() as discoverSession:
-            async with discoverSession.get(
-                "https://api.nuki.io/discover/bridges"
-            ) as res:
-                data = await res.json()
-                logger.debug(f"Discovery returned {data}")
-                error_code = data.get("errorCode", -9999)
-                if error_code != 0:
-                    logger.error(f"Discovery failed with error code {error_code}")
-                bridges = data.get("bridges")
-                if not bridges:
-                    logger.warning("No bridge discovered.")
-                    return []
-                else:
-                    toret = []
-                    for x in bridges:
-
-                        DiscoveredBridge = partial(
-                            NukiBridge, x.get("ip"), port=x.get("port")
-                        )
-
-                        toret.append(DiscoveredBridge)
-                    return toret
+    async def discover(
+        cache_path=None, cache_ttl=DISCOVERY_CACHE_TTL, lan=None, **kwargs
+    ):
+        """
+        Discover bridges through nuki.io, or by probing the lan network or host
+        list for bridges. When cache_path is set, results are cached on disk for
+        cache_ttl seconds. Extra keyword arguments go to the discovery function.
+        """
+        bridges = await discovery.discover(
+            cache_path=cache_path, cache_ttl=cache_ttl, lan=lan, **kwargs
+        )
+        if not bridges:
+            logger.warning("No bridge discovered.")
+            return []
+        else:
+            toret = []
+            for x in bridges:
+
+                DiscoveredBridge = partial(NukiBridge, x.get("ip"), port=x.get("port"))
+
+                toret.append(DiscoveredBridge)
+            return toret
 
     @property
     def bridgeId(self):
         return f"{self.hostname}:{self.port}"
 
+    def timestamp(self):
+        """Current time on the bridge's clock, as seconds since the epoch"""
+        return time.time() + self.clock_offset
+
+    def now(self):
+        """Current time on the bridge's clock, used to stamp device states"""
+        return datetime.fromtimestamp(self.timestamp(), timezone.utc)
+
+    def _measure_clock(self, bridge_time, sent, received):
+        """
+        Update clock_offset from a bridge time (datetime, whole seconds) read
+        from a response to a request sent and received at the given times.
+        """
+        # The bridge time was truncated somewhere between sent and received
+        offset = bridge_time.timestamp() + 0.5 - (sent + received) / 2
+        if abs(offset - self.clock_offset) >= CLOCK_RESYNC_THRESHOLD:
+            logger.info(f"{self} clock is off by {offset:.1f}s, compensating")
+        self.clock_offset = offset
+
     # not using token.setter, since this would force caling .info() without await. Using self.connect(token=None) instead
     async def connect(self, token=None):
         if token:
@@ -120,7 +221,9 @@ class NukiBridge(object):
         info = await self.info()
         return info.get("bridgeType") == const.BRIDGE_TYPE_HW
 
-    async def __rq(self, endpoint, params=None, timeout=None):
+    async def __rq(
+        self, endpoint, params=None, timeout=None, priority=PRIORITY_DEFAULT
+    ):
         if timeout == None:
             timeout = self.requests_timeout
 
@@ -130,29 +233,132 @@ class NukiBridge(object):
             # await self.endSession()
             await self.startSession()
 
-        url = f"{self.__api_url}/{endpoint}"
-        if self.secure:
-            get_params = hash_token(self.token)
-        else:
-            get_params = {"token": self.token}
-        if params:
-            get_params.update(params)
-        # Convert list to string to prevent request from encoding the url params
-        # https://stackoverflow.com/a/23497912
-        get_params_str = "&".join(f"{k}={v}" for k, v in get_params.items())
-
-        async with self.session.get(
-            url,
-            params=get_params_str,
-            timeout=timeout,
-            raise_for_status=True,
-        ) as res:
-            data = await res.json()
-            if "success" in data:
-                if not data.get("success"):
-                    logger.warning(f"Call failed: {res}")
+        idempotent = endpoint in IDEMPOTENT_ENDPOINTS
+        retry = self.read_retry if idempotent else self.action_retry
+
+        attempt = 0
+        resynced = False
+        while True:
+            if not self.breaker.allow():
+                err = BridgeUnavailableException(
+                    f"{self.bridgeId} is unavailable, "
+                    f"retrying in {self.breaker.retry_in:.0f}s"
+                )
+                if self.hooks:
+                    # Rejected without being sent, started_at stays None
+                    ctx = RequestContext(self, endpoint, priority, attempt)
+                    self._request_failed(ctx, err)
+                raise err
+            ctx = None
+            if self.hooks:
+                ctx = RequestContext(self, endpoint, priority, attempt)
+            clock_offset = self.clock_offset
+            try:
+                data = await self.__send(endpoint, params, timeout, priority, ctx)
+            except Exception as err:
+                if is_bridge_failure(err):
+                    self.breaker.record_failure()
+                elif isinstance(err, aiohttp.ClientResponseError):
+                    # Answered, eg: 401 or 404, the bridge itself is fine
+                    self.breaker.record_success()
+                # A drifted clock makes hashed tokens look expired, try again
+                # once with the offset measured from the rejection
+                if (
+                    getattr(err, "status", None) == 401
+                    and self.secure
+                    and not resynced
+                    and abs(self.clock_offset - clock_offset) >= CLOCK_RESYNC_THRESHOLD
+                ):
+                    resynced = True
+                    continue
+                if not retry.should_retry(err, attempt, idempotent):
+                    raise
+                delay = retry.delay(attempt)
+                logger.debug(f"{endpoint} failed ({err!r}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+            else:
+                self.breaker.record_success()
+                return data
+
+    def _request_builder(self):
+        builder = self._builder
+        # token and secure are public and change, eg: after auth()
+        if builder.token != self.token or builder.secure != self.secure:
+            builder = self._builder = RequestBuilder(
+                builder.base_url, self.token, self.secure, clock=self.timestamp
+            )
+        return builder
+
+    async def __send(self, endpoint, params, timeout, priority, ctx=None):
+        async with self.scheduler.slot(priority):
+            if ctx is not None:
+                ctx.started_at = time.perf_counter()
+                self._call_hooks("on_request_start", ctx)
+
+            # Sign once the slot is granted, the bridge rejects stale timestamps
+            url = self._request_builder().url(endpoint, params)
+
+            sent = time.time()
+            try:
+                async with self.session.get(
+                    url,
+                    timeout=timeout,
+                    raise_for_status=True,
+                ) as res:
+                    data = await res.json()
+                    if "success" in data:
+                        if not data.get("success"):
+                            logger.warning(f"Call failed: {res}")
+            except aiohttp.ClientResponseError as err:
+                if err.status == 401 and err.headers and "Date" in err.headers:
+                    try:
+                        bridge_time = parsedate_to_datetime(err.headers["Date"])
+                    except (TypeError, ValueError):
+                        pass
+                    else:
+                        if bridge_time.tzinfo is None:
+                            bridge_time = bridge_time.replace(tzinfo=timezone.utc)
+                        self._measure_clock(bridge_time, sent, time.time())
+                self._request_failed(ctx, err)
+                raise
+            except Exception as err:
+                self._request_failed(ctx, err)
+                raise
+
+            if endpoint == "info" and isinstance(data, dict):
+                bridge_time = parse_timestamp(data.get("currentTime"))
+                if bridge_time is not None:
+                    self._measure_clock(bridge_time, sent, time.time())
+
+            if ctx is not None:
+                ctx.ended_at = time.perf_counter()
+                ctx.status = res.status
+                self._call_hooks("on_request_end", ctx)
             return data
 
+    def _request_failed(self, ctx, err):
+        if ctx is not None:
+            ctx.ended_at = time.perf_counter()
+            ctx.status = getattr(err, "status", None)
+            self._call_hooks("on_request_error", ctx, err)
+
+    # Instrumentation
+
+    def add_hook(self, hook):
+        """Add a RequestHooks instance, called around every request attempt"""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def _call_hooks(self, name, *args):
+        for hook in self.hooks:
+            try:
+                getattr(hook, name)(*args)
+            except Exception:
+                logger.exception(f"Request hook {hook} failed")
+
     async def auth(self):
         res = await self.__rq("auth", timeout=self.auth_timeout)
         self.token = res.get("token")
@@ -162,7 +368,9 @@ class NukiBridge(object):
         return await self.__rq("configAuth", {"enable": 1 if enable else 0})
 
     async def list(self, device_type=None):
-        data = await self.__rq("list")
+        data = await self.cache.get(
+            "list", lambda: self.__rq("list", priority=PRIORITY_POLL)
+        )
         if device_type is not None:
             return [x for x in data if x.get("deviceType") == device_type]
         return data
@@ -175,70 +383,225 @@ class NukiBridge(object):
     async def lock_action(
         self, nuki_id, action, device_type=const.DEVICE_TYPE_LOCK, block=False
     ):
+        if block and self.track_actions:
+            # Keep the bridge free while the motor runs, see ActionTracker
+            dev = self.registry.get(nuki_id, device_type)
+            if dev is not None and self.actions.can_track(dev, action):
+                return await self.actions.run(dev, action)
+
         params = {
             "nukiId": nuki_id,
             "deviceType": device_type,
             "action": action,
             "noWait": 0 if block else 1,
         }
-        return await self.__rq("lockAction", params)
+        self._action_sent()
+        return await self.__rq("lockAction", params, priority=PRIORITY_ACTION)
+
+    async def bulk_action(
+        self,
+        action,
+        device_type=const.DEVICE_TYPE_LOCK,
+        where=None,
+        wait=False,
+        concurrency=BULK_CONCURRENCY,
+    ):
+        """
+        Run action on every device of device_type for which where(device) is
+        true, or on all of them. Returns a BulkResult, see actions.run_bulk.
+        """
+        devices = await self._get_devices(device_type)
+        if where is not None:
+            devices = [dev for dev in devices if where(dev)]
+        return await run_bulk(self, devices, action, wait, concurrency)
 
     async def unpair(self, nuki_id, device_type=const.DEVICE_TYPE_LOCK):
+        self.cache.invalidate("list")
         return await self.__rq("unpair", {"nukiId": nuki_id, "deviceType": device_type})
 
     async def info(self):
-        # Return cached value
-        if self._json:
-            return self._json
-        data = await self.__rq("info")
+        data = await self.cache.get("info", self._fetch_info)
         self._json = data
         return data
 
+    async def _fetch_info(self):
+        data = await self.__rq("info", priority=PRIORITY_POLL)
+        if self.telemetry is not None:
+            self._record_info(data)
+        return data
+
+    def _record_info(self, data):
+        now = time.time()
+        self.telemetry.record(data, now)
+        for scan in data.get("scanResults", []):
+            dev = self.registry.get(scan.get("nukiId"), scan.get("deviceType"))
+            if dev is not None and scan.get("rssi") is not None:
+                dev.telemetry.record_value("rssi", scan["rssi"], now)
+
     # Callback endpoints
 
-    async def callback_get_id_by_url(self, callback_url):
-        installedCalbacks = await self.callback_list()
+    async def _callback_entries(self, need_ids=False):
+        """
+        The bridge's callbacks from the local mirror, listed from the bridge
+        when unknown. Ids are None when a change may have shifted them.
+        """
+        if self._callbacks is None or (
+            need_ids and any(cb["id"] is None for cb in self._callbacks)
+        ):
+            await self.callback_list()
+        return self._callbacks
 
-        for i in installedCalbacks["callbacks"]:
+    async def callback_get_id_by_url(self, callback_url):
+        for i in await self._callback_entries(need_ids=True):
             if i["url"] == callback_url:
                 return i
         return -1
 
     async def callback_add(self, callback_url, check_if_exists=True):
         if check_if_exists:
-            if await self.callback_get_id_by_url(callback_url) != -1:
+            if any(cb["url"] == callback_url for cb in await self._callback_entries()):
                 return {"success": True}
 
-        return await self.__rq("callback/add", {"url": callback_url})
+        res = await self.__rq("callback/add", {"url": callback_url})
+        if res.get("success") and self._callbacks is not None:
+            self._callbacks.append({"id": None, "url": callback_url})
+        else:
+            self._callbacks = None
+        return res
 
     async def callback_list(self):
-        return await self.__rq("callback/list")
+        res = await self.__rq("callback/list")
+        self._callbacks = [
+            {"id": cb["id"], "url": cb["url"]} for cb in res.get("callbacks", [])
+        ]
+        return res
 
     async def callback_remove(self, callback_id):
-        return await self.__rq("callback/remove", {"id": callback_id})
+        res = await self.__rq("callback/remove", {"id": callback_id})
+        if res.get("success") and self._callbacks is not None:
+            callbacks = []
+            for cb in self._callbacks:
+                if cb["id"] == callback_id:
+                    continue
+                if cb["id"] is not None and cb["id"] > callback_id:
+                    # The bridge may renumber the following callbacks
+                    cb = {"id": None, "url": cb["url"]}
+                callbacks.append(cb)
+            self._callbacks = callbacks
+        else:
+            self._callbacks = None
+        return res
 
     async def callback_remove_by_url(self, callback_url):
-        foundNumber = await self.callback_get_id_by_url(callback_url)
+        found = await self.callback_get_id_by_url(callback_url)
 
-        if foundNumber != -1:
-            return await self.__rq("callback/remove", {"id": foundNumber})
+        if found != -1:
+            return await self.callback_remove(found["id"])
         else:
             return {"success": False}
 
     async def callback_remove_all(self):
-        for i in range(0, 3):
-            await self.callback_remove(i)
+        # Highest ids first, removing one never changes the ids left to remove
+        callbacks = await self._callback_entries(need_ids=True)
+        for cb in sorted(callbacks, key=lambda cb: cb["id"], reverse=True):
+            await self.callback_remove(cb["id"])
+
+    async def ensure_callbacks(self, callback_urls, remove_others=True):
+        """
+        Make callback_urls the bridge's callbacks, with only the needed add and
+        remove requests. Callbacks are listed once, then tracked locally: when
+        nothing changed, no request is made at all.
+        With remove_others, callbacks with other urls are removed first.
+        Returns a dict of the added, removed and failed urls: those the bridge
+        rejected, or that didn't fit within its CALLBACK_LIMIT callbacks.
+        """
+        wanted = list(dict.fromkeys(callback_urls))
+        callbacks = await self._callback_entries()
+        removed = []
+        if remove_others and any(cb["url"] not in wanted for cb in callbacks):
+            callbacks = await self._callback_entries(need_ids=True)
+            extra = [cb for cb in callbacks if cb["url"] not in wanted]
+            for cb in sorted(extra, key=lambda cb: cb["id"], reverse=True):
+                await self.callback_remove(cb["id"])
+                removed.append(cb["url"])
+
+        present = {cb["url"] for cb in await self._callback_entries()}
+        added = []
+        failed = []
+        for url in wanted:
+            if url in present:
+                continue
+            if len(present) + len(added) >= CALLBACK_LIMIT:
+                logger.warning(f"{self} has no room left for callback {url}")
+                failed.append(url)
+                continue
+            res = await self.callback_add(url, check_if_exists=False)
+            if res.get("success"):
+                added.append(url)
+            else:
+                logger.warning(f"{self} rejected callback {url}: {res}")
+                failed.append(url)
+        return {"added": added, "removed": removed, "failed": failed}
 
     async def interpret_callback(self, data):
         # {'deviceType': 0, 'nukiId': 490318788, 'mode': 2, 'state': 3, 'stateName': 'unlocked', 'batteryCritical': False, 'batteryCharging': False, 'batteryChargeState': 70, 'doorsensorState': 3, 'doorsensorStateName': 'door opened'}
-        await self.getDeviceFromManagedDevices(data.get("nukiId")).update(
-            {k: v for k, v in data.items() if k != "nukiId"}
+        dev = self.getDeviceFromManagedDevices(
+            data.get("nukiId"), data.get("deviceType")
         )
+        self.last_callback = time.monotonic()
+        self.cache.invalidate("list")
+        if dev is None:
+            logger.warning(f"Callback for unknown device: {data}")
+            return
+        # nukiId is unchanged by definition, no need to copy data without it
+        await dev.update(data, source=SOURCE_CALLBACK)
+
+    # Polling
+
+    def start_polling(self, **kwargs):
+        """
+        Start an AdaptivePoller keeping the managed devices up to date.
+        Keyword arguments are passed to AdaptivePoller.
+        """
+        if self.poller is None:
+            self.poller = AdaptivePoller(self, **kwargs)
+        self.poller.start()
+        return self.poller
+
+    async def stop_polling(self):
+        if self.poller is not None:
+            await self.poller.stop()
+
+    def _action_sent(self):
+        self.last_action = time.monotonic()
+        self.cache.invalidate("list")
+        if self.poller is not None:
+            self.poller.notify_action()
 
     # Maintainance endpoints
 
     async def log(self, offset=0, count=100):
-        return await self.__rq("log", {"offset": offset, "count": count})
+        return await self.__rq(
+            "log", {"offset": offset, "count": count}, priority=PRIORITY_POLL
+        )
+
+    async def iter_log(self, page_size=LOG_PAGE_SIZE, stop=None):
+        """
+        Async generator over the log entries, newest first, fetched page_size
+        at a time. Stops before the first entry for which stop(entry) is true,
+        eg: one that was already seen, so only the new pages are requested.
+        """
+        page_size = min(page_size, LOG_PAGE_SIZE)
+        offset = 0
+        while True:
+            page = await self.log(offset, page_size)
+            for entry in page:
+                if stop is not None and stop(entry):
+                    return
+                yield entry
+            if len(page) < page_size:
+                return
+            offset += len(page)
 
     async def clear_log(self):
         return await self.__rq("clearlog")
@@ -256,71 +619,108 @@ class NukiBridge(object):
 
     async def update(self):
         # Invalidate cache
-        self._json = None
+        self.cache.invalidate("info")
         return await self.info()
 
-    async def _get_devices(self, device_type=None):
-        devices = []
-        for l in await self.list(device_type=device_type):
-            # lock_data holds the name and nuki id of the lock
-            # eg: {'name': 'Home', 'nukiId': 241563832}
-            device_data = {k: v for k, v in l.items() if k not in ["lastKnownState"]}
-            # state_data holds the last known state of the lock
-            # eg: {'batteryCritical': False, 'state': 1, 'stateName': 'locked'}
-            state_data = {
-                k: v for k, v in l["lastKnownState"].items() if k not in ["timestamp"]
-            }
-
-            # Merge lock_data and state_data
-            data = {**device_data, **state_data}
-
-            dev_type = device_data.get("deviceType")
-            if dev_type == const.DEVICE_TYPE_LOCK:
-                dev = NukiLock(self, data)
-            elif dev_type == const.DEVICE_TYPE_OPENER:
-                dev = NukiOpener(self, data)
-            else:
-                logger.warning(f"Unknown device type: {dev_type}")
-                dev = NukiDevice(self, data)
+    async def ensure_fresh(self, max_age=None):
+        """
+        Bring every device's state within max_age seconds using the cheapest
+        sources, see NukiDevice.update with AGGRESSIVE_AUTO. The devices
+        share a single /list request.
+        """
+        if not self.registry.initialized:
+            await self.refresh_devices()
+        await asyncio.gather(
+            *[
+                dev.update(aggressive=AGGRESSIVE_AUTO, max_age=max_age)
+                for dev in self.registry
+            ]
+        )
 
-            devices.append(dev)
+    async def refresh_devices(self):
+        """
+        Fetch /list and reconcile the managed devices in place.
+        Returns a RegistryChanges tuple with the added and removed devices.
+
+        Concurrent callers (and those arriving within refresh_window seconds)
+        share a single in-flight /list request.
+        """
+        if self._refresh_future is None:
+            self._refresh_future = asyncio.ensure_future(self._refresh_devices())
+            self._refresh_future.add_done_callback(self._refresh_done)
+        # Shield so a cancelled caller doesn't cancel the refresh for the others
+        return await asyncio.shield(self._refresh_future)
+
+    def _refresh_done(self, future):
+        if self._refresh_future is future:
+            self._refresh_future = None
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not future.cancelled():
+            future.exception()
+
+    async def _refresh_devices(self):
+        if self.refresh_window:
+            await asyncio.sleep(self.refresh_window)
+        requested_at = time.monotonic()
+        entries = [flatten_list_entry(l) for l in await self.list()]
+        # The response may come from the cache, use its original request time
+        entry = self.cache.entry("list")
+        if entry is not None:
+            requested_at = min(requested_at, entry.requested_at)
+        changes = self.registry.reconcile(entries, requested_at=requested_at)
+        self.last_refresh = time.monotonic()
+        for dev in changes.added:
+            logger.debug(f"Device added: {dev}")
+        for dev in changes.removed:
+            logger.info(f"Device removed: {dev}")
+        return changes
+
+    def revalidate(self):
+        """
+        Refresh /info and the devices in the background, eg: after restoring
+        the bridge from a snapshot. Returns the task.
+        """
+        return asyncio.ensure_future(self._revalidate())
+
+    async def _revalidate(self):
+        try:
+            await self.update()
+            await self.refresh_devices()
+        except Exception as err:
+            logger.warning(f"Revalidating {self} failed: {err!r}")
 
-        self.managedDevices = devices
-        return devices
+    async def _get_devices(self, device_type=None):
+        await self.refresh_devices()
+        if device_type is None:
+            return list(self.registry)
+        return [d for d in self.registry if d.device_type == device_type]
 
     async def getDevices(self):
         await self._get_devices()
         return self.managedDevices
 
+    @property
+    def managedDevices(self):
+        if not self.registry.initialized:
+            return None
+        return list(self.registry)
+
     @property
     async def locks(self):
-        if self.managedDevices == None:
+        if not self.registry.initialized:
             raise BridgeUninitializedException
-        else:
-            devices = []
-            for d in self.managedDevices:
-                if isinstance(d, NukiLock):
-                    devices.append(d)
-            return devices
+        return [d for d in self.registry if isinstance(d, NukiLock)]
 
     @property
     async def openers(self):
-        if self.managedDevices == None:
+        if not self.registry.initialized:
             raise BridgeUninitializedException
-        else:
-            devices = []
-            for d in self.managedDevices:
-                if isinstance(d, NukiOpener):
-                    devices.append(d)
-            return devices
-
-    def getDeviceFromManagedDevices(self, nukiId):
-        if self.managedDevices == None:
+        return [d for d in self.registry if isinstance(d, NukiOpener)]
+
+    def getDeviceFromManagedDevices(self, nukiId, deviceType=None):
+        if not self.registry.initialized:
             raise BridgeUninitializedException
-        else:
-            for d in self.managedDevices:
-                if d.nuki_id == nukiId:
-                    return d
+        return self.registry.get(nukiId, deviceType)
 
     async def lock(self, nuki_id, block=False):
         return await self.lock_action(
@@ -338,6 +738,12 @@ class NukiBridge(object):
             block=block,
         )
 
+    async def lock_all(self, where=None, wait=False):
+        return await self.bulk_action(const.ACTION_LOCK_LOCK, where=where, wait=wait)
+
+    async def unlock_all(self, where=None, wait=False):
+        return await self.bulk_action(const.ACTION_LOCK_UNLOCK, where=where, wait=wait)
+
     async def lock_n_go(self, nuki_id, unlatch=False, block=False):
         action = const.ACTION_LOCK_LOCK_N_GO
         if unlatch:
@@ -358,7 +764,17 @@ class NukiBridge(object):
         )
 
     async def simple_lock(self, nuki_id, device_type=const.DEVICE_TYPE_LOCK):
-        return await self.__rq("lock", {"nukiId": nuki_id, "deviceType": device_type})
+        self._action_sent()
+        return await self.__rq(
+            "lock",
+            {"nukiId": nuki_id, "deviceType": device_type},
+            priority=PRIORITY_ACTION,
+        )
 
     async def simple_unlock(self, nuki_id, device_type=const.DEVICE_TYPE_LOCK):
-        return await self.__rq("unlock", {"nukiId": nuki_id, "deviceType": device_type})
+        self._action_sent()
+        return await self.__rq(
+            "unlock",
+            {"nukiId": nuki_id, "deviceType": device_type},
+            priority=PRIORITY_ACTION,
+        )
@@ -0,0 +1,105 @@
+# coding: utf-8
+
+import asyncio
+import time
+
+from .utils import logger
+
+# endpoint -> (ttl, stale_ttl) in seconds. Within ttl the cached response is
+# served as is, during the following stale_ttl it is served while being
+# refreshed in the background.
+DEFAULT_TTLS = {
+    "info": (300, 3600),
+    "list": (1, 0),
+}
+
+
+class CacheEntry(object):
+    __slots__ = ("value", "requested_at")
+
+    def __init__(self, value, requested_at):
+        self.value = value
+        # time.monotonic() the request was issued at
+        self.requested_at = requested_at
+
+    @property
+    def age(self):
+        return time.monotonic() - self.requested_at
+
+
+class ResponseCache(object):
+    """
+    Per endpoint response cache with TTLs and stale-while-revalidate.
+
+    Concurrent fetches of the same key share one request. A response whose
+    key was invalidated while it was in flight is returned to its callers
+    but not cached.
+    """
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self._entries = {}
+        self._inflight = {}
+        self._generations = {}
+
+    def entry(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, value, requested_at=None):
+        if requested_at is None:
+            requested_at = time.monotonic()
+        self._entries[key] = CacheEntry(value, requested_at)
+
+    def invalidate(self, *keys):
+        """Drop the given keys, or every key if none is given."""
+        for key in keys or list(self._entries):
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    async def get(self, key, fetch):
+        """
+        Return the cached response for key, calling the coroutine function
+        fetch() when it's missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            ttl, stale_ttl = self.ttls.get(key, (0, 0))
+            age = entry.age
+            if age <= ttl:
+                return entry.value
+            if age <= ttl + stale_ttl:
+                if key not in self._inflight:
+                    asyncio.ensure_future(self._revalidate(key, fetch))
+                return entry.value
+        return await self._fetch(key, fetch)
+
+    async def _fetch(self, key, fetch):
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._store(key, fetch))
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._fetch_done(key, f))
+        return await asyncio.shield(future)
+
+    def _fetch_done(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not future.cancelled():
+            future.exception()
+
+    async def _store(self, key, fetch):
+        generation = self._generations.get(key, 0)
+        requested_at = time.monotonic()
+        value = await fetch()
+        if self._generations.get(key, 0) == generation:
+            self._entries[key] = CacheEntry(value, requested_at)
+        return value
+
+    async def _revalidate(self, key, fetch):
+        try:
+            await self._fetch(key, fetch)
+        except Exception as err:
+            logger.warning(f"Revalidating {key} failed: {err!r}")
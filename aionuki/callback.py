@@ -0,0 +1,249 @@
+# coding: utf-8
+
+import asyncio
+import time
+from aiohttp import web
+
+from .utils import get_local_ip, logger, sha256sum
+
+# Default values
+CALLBACK_PORT = 7123
+CALLBACK_ROUTE = "/nuki"
+CALLBACK_QUEUE_SIZE = 1000
+# Callback payloads are a few hundred bytes, anything larger is not from a bridge
+CALLBACK_MAX_SIZE = 4096
+
+
+def _unmapped(address):
+    """IPv4 address of an IPv4-mapped IPv6 address, eg: ::ffff:192.168.1.50"""
+    if address and address.startswith("::ffff:") and "." in address:
+        return address[7:]
+    return address
+
+
+class CallbackCoalescer(object):
+    """
+    Ingestion stage in front of interpret_callback.
+
+    Drops callbacks changing nothing on their device, eg: the same state sent
+    twice. They're compared with the device's state, which may have changed
+    since through /list or lockState, not the previous callback. They still
+    count as received and confirm the device's state as fresh. With a
+    window, the callbacks of a device arriving within window seconds of the
+    first one are merged and only the final state is delivered, eg: unlocking
+    then unlocked delivers unlocked once.
+    """
+
+    def __init__(self, deliver, window=0, dedupe=True):
+        # Coroutine function called with (bridge, data)
+        self._deliver = deliver
+        self.window = window
+        self.dedupe = dedupe
+        self.duplicates = 0
+        self.coalesced = 0
+        self._pending = {}
+
+    async def submit(self, bridge, data):
+        key = (bridge.bridgeId, data.get("nukiId"), data.get("deviceType"))
+        if self.dedupe and key not in self._pending:
+            # A pending burst may still have to end up in this state
+            dev = bridge.registry.get(data.get("nukiId"), data.get("deviceType"))
+            if dev is not None and dev.matches(data):
+                # Not applied, but callbacks work and the state is confirmed
+                now = time.monotonic()
+                bridge.last_callback = now
+                dev.last_updated = now
+                self.duplicates += 1
+                return
+
+        if not self.window:
+            await self._deliver(bridge, data)
+            return
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending[1].update(data)
+            self.coalesced += 1
+            return
+        self._pending[key] = (bridge, dict(data))
+        asyncio.get_event_loop().call_later(
+            self.window, lambda: asyncio.ensure_future(self._flush(key))
+        )
+
+    async def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        bridge, data = pending
+        try:
+            await self._deliver(bridge, data)
+        except Exception:
+            logger.exception(f"Failed to process callback from {bridge}: {data}")
+
+    async def flush(self):
+        """Deliver every pending burst right away."""
+        for key in list(self._pending):
+            await self._flush(key)
+
+
+class NukiCallbackServer(object):
+    """
+    HTTP server receiving the callbacks of any number of bridges.
+
+    Every registered bridge gets its own callback url, so payloads are routed
+    with a dict lookup. With check_remote, callbacks are only accepted from
+    the addresses of the bridge's hostname, resolved when it's registered.
+    Requests are validated and queued, then answered right
+    away. A single worker applies the queue to the devices in arrival order,
+    through a CallbackCoalescer dropping duplicates and merging bursts.
+    """
+
+    def __init__(
+        self,
+        host="0.0.0.0",
+        port=CALLBACK_PORT,
+        public_host=None,
+        route=CALLBACK_ROUTE,
+        queue_size=CALLBACK_QUEUE_SIZE,
+        coalesce_window=0,
+        dedupe=True,
+        check_remote=True,
+    ):
+        self.host = host
+        self.port = port
+        if public_host is None:
+            public_host = get_local_ip() if host == "0.0.0.0" else host
+        self.public_host = public_host
+        self.route = route.rstrip("/")
+        self.queue_size = queue_size
+        self.bridges = {}
+        self.check_remote = check_remote
+        # Bridge key -> addresses its callbacks may come from, None for any
+        self._remotes = {}
+        self.received = 0
+        self.dropped = 0
+        self.coalescer = CallbackCoalescer(
+            self._interpret, window=coalesce_window, dedupe=dedupe
+        )
+        self._queue = None
+        self._worker = None
+        self._runner = None
+
+    def __repr__(self):
+        return f"<NukiCallbackServer: {self.base_url} ({len(self.bridges)} bridges)>"
+
+    @property
+    def base_url(self):
+        return f"http://{self.public_host}:{self.port}{self.route}"
+
+    @staticmethod
+    def bridge_key(bridge):
+        # Stable across restarts, so the urls stored on the bridges stay valid
+        return sha256sum(bridge.bridgeId)[:12]
+
+    def url_for(self, bridge):
+        return f"{self.base_url}/{self.bridge_key(bridge)}"
+
+    async def register(self, bridge, add_callback=True):
+        key = self.bridge_key(bridge)
+        self.bridges[key] = bridge
+        if self.check_remote:
+            self._remotes[key] = await self._resolve(bridge.hostname)
+        if add_callback:
+            return await bridge.callback_add(self.url_for(bridge))
+
+    async def unregister(self, bridge, remove_callback=True):
+        self.bridges.pop(self.bridge_key(bridge), None)
+        self._remotes.pop(self.bridge_key(bridge), None)
+        if remove_callback:
+            return await bridge.callback_remove_by_url(self.url_for(bridge))
+
+    async def start(self):
+        self._queue = asyncio.Queue(self.queue_size)
+        self._worker = asyncio.ensure_future(self._consume())
+
+        app = web.Application(client_max_size=CALLBACK_MAX_SIZE)
+        app.router.add_post(self.route + "/{key}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        # Resolve the actual port when started on port 0
+        self.port = self._runner.addresses[0][1]
+        logger.info(f"Callback server listening on {self.base_url}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        # Apply the callbacks already accepted
+        if self._queue is not None:
+            await self.join()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.stop()
+
+    async def _handle(self, request):
+        key = request.match_info["key"]
+        bridge = self.bridges.get(key)
+        if bridge is None:
+            return web.Response(status=404, text="err: unknown bridge")
+        remotes = self._remotes.get(key)
+        if remotes is not None and _unmapped(request.remote) not in remotes:
+            logger.warning(f"Rejected callback for {bridge} from {request.remote}")
+            return web.Response(status=403, text="err: unexpected sender")
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="err: invalid json")
+        if not isinstance(data, dict) or not isinstance(data.get("nukiId"), int):
+            return web.Response(status=400, text="err: invalid payload")
+
+        try:
+            self._queue.put_nowait((bridge, data))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Callback queue full, dropping callback from {bridge}")
+            return web.Response(status=503, text="err: busy")
+
+        self.received += 1
+        return web.Response(text="ok")
+
+    async def _consume(self):
+        while True:
+            bridge, data = await self._queue.get()
+            try:
+                await self.coalescer.submit(bridge, data)
+            except Exception:
+                logger.exception(f"Failed to process callback from {bridge}: {data}")
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    async def _resolve(hostname):
+        try:
+            infos = await asyncio.get_event_loop().getaddrinfo(hostname, None)
+        except OSError as err:
+            logger.warning(f"Could not resolve {hostname} ({err!r}), not checking")
+            return None
+        return {_unmapped(info[4][0]) for info in infos}
+
+    @staticmethod
+    async def _interpret(bridge, data):
+        await bridge.interpret_callback(data)
+
+    async def join(self):
+        """Wait until every queued callback has been applied."""
+        await self._queue.join()
+        await self.coalescer.flush()
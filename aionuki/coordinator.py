@@ -0,0 +1,180 @@
+# coding: utf-8
+
+import asyncio
+import time
+
+from .utils import logger
+
+# Default values, in seconds
+# Shortest time between two refreshes, whatever the consumers ask for
+COORDINATOR_MIN_INTERVAL = 1
+# Longest wait before retrying after failed refreshes, doubling from
+# min_interval. Longer if the bridge's circuit breaker is open
+COORDINATOR_MAX_BACKOFF = 60
+
+
+class Interest(object):
+    """A consumer's registration with an UpdateCoordinator"""
+
+    def __init__(self, coordinator, max_age, keys=None):
+        self.coordinator = coordinator
+        self.max_age = max_age
+        # (nukiId, deviceType) of the devices of interest, None for all
+        self.keys = keys
+
+    def __repr__(self):
+        return f"<Interest: max_age={self.max_age} keys={self.keys}>"
+
+    @property
+    def devices(self):
+        return self.coordinator._devices(self.keys)
+
+    async def get(self):
+        """The devices of interest, refreshed first if they're too old"""
+        return await self.coordinator.get(self.max_age, self.keys)
+
+    def cancel(self):
+        self.coordinator.unregister(self)
+
+
+class UpdateCoordinator(object):
+    """
+    Owns the refreshes of a bridge on behalf of any number of consumers.
+
+    Consumers register the age their devices' states may reach. A single
+    /list request is made when the oldest state of interest of any consumer
+    reaches its limit, so it satisfies every consumer at once. States kept
+    fresh by callbacks push the next refresh back. Concurrent on demand
+    refreshes share the same request.
+    """
+
+    def __init__(self, bridge, min_interval=COORDINATOR_MIN_INTERVAL):
+        self.bridge = bridge
+        self.min_interval = min_interval
+        self.interests = []
+        # /list refreshes made by the coordinator
+        self.refreshes = 0
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    def __repr__(self):
+        return f"<UpdateCoordinator: {self.bridge} ({len(self.interests)} consumers)>"
+
+    def register(self, max_age, devices=None):
+        """
+        Keep the states of devices, or of every device of the bridge, at most
+        max_age seconds old. Returns an Interest, cancel it to unregister.
+        """
+        keys = None
+        if devices is not None:
+            keys = {(dev.nuki_id, dev.device_type) for dev in devices}
+        interest = Interest(self, max_age, keys)
+        self.interests.append(interest)
+        # The next refresh may be due sooner
+        self._wakeup.set()
+        return interest
+
+    def unregister(self, interest):
+        if interest in self.interests:
+            self.interests.remove(interest)
+
+    def _devices(self, keys=None):
+        registry = self.bridge.registry
+        if keys is None:
+            return list(registry)
+        devices = (registry.get(*key) for key in keys)
+        return [dev for dev in devices if dev is not None]
+
+    def _deadline(self, max_age, keys=None):
+        """time.monotonic() at which a state of interest gets too old"""
+        if not self.bridge.registry.initialized:
+            return 0
+        devices = self._devices(keys)
+        deadlines = [dev.last_updated + max_age for dev in devices]
+        if keys and len(devices) < len(keys):
+            # Missing from the last /list, look for them again once it's as
+            # old as a state may get
+            last = self.bridge.last_refresh
+            deadlines.append(0 if last is None else last + max_age)
+        return min(deadlines) if deadlines else None
+
+    def next_refresh(self):
+        """time.monotonic() of the next refresh, None without consumers"""
+        deadlines = [
+            self._deadline(interest.max_age, interest.keys)
+            for interest in self.interests
+        ]
+        deadlines = [d for d in deadlines if d is not None]
+        return min(deadlines) if deadlines else None
+
+    async def refresh(self):
+        self.refreshes += 1
+        await self.bridge.refresh_devices()
+
+    async def get(self, max_age, keys=None):
+        """
+        Devices whose states are at most max_age seconds old, refreshing them
+        only if needed.
+        """
+        deadline = self._deadline(max_age, keys)
+        if deadline is not None and deadline <= time.monotonic():
+            await self.refresh()
+        return self._devices(keys)
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sleep(self, delay):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def _backoff(self, failures):
+        """Seconds to wait after failures consecutive failed refreshes"""
+        delay = min(self.min_interval * 2**failures, COORDINATOR_MAX_BACKOFF)
+        return max(delay, self.bridge.breaker.retry_in)
+
+    async def _run(self):
+        last = 0
+        failures = 0
+        while True:
+            deadline = self.next_refresh()
+            now = time.monotonic()
+            if deadline is None or deadline > now:
+                await self._sleep(None if deadline is None else deadline - now)
+                continue
+            # Don't hammer the bridge when a refresh doesn't help, eg: a
+            # consumer asking for a shorter max_age
+            wait = last + self.min_interval - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+            last = time.monotonic()
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                failures += 1
+                delay = self._backoff(failures)
+                # Only the first failure of a streak is worth a warning
+                log = logger.warning if failures == 1 else logger.debug
+                log(f"Refreshing {self.bridge} failed: {err!r}, retry in {delay:.0f}s")
+                await asyncio.sleep(delay)
+            else:
+                failures = 0
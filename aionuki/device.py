@@ -1,104 +1,260 @@
 # coding: utf-8
 
-from . import constants as const
+import time
+
+from .freshness import AGGRESSIVE_AUTO
+from .state import DEVICE_TYPE_NAMES, MODE_NAMES, DeviceState
+from .telemetry import DEVICE_METRICS, Telemetry
+from .events import (
+    EventEmitter,
+    StateChangeEvent,
+    SOURCE_LOCK_STATE,
+    SOURCE_UPDATE,
+)
 from .utils import logger
 from .exceptions import NukiUpdateException
 
+_MISSING = object()
+
 
 class NukiDevice(object):
-    def __init__(self, bridge, json):
+    def __init__(self, bridge, json, timestamp=None, source=SOURCE_UPDATE):
         self._bridge = bridge
-        self._json = json
+        # Parsed once, see state.DeviceState. The JSON is rebuilt on demand.
+        self._state = DeviceState(json)
+        # Time the state is valid as of, on the bridge's clock
+        self.state_timestamp = timestamp
+        # Origin of the last accepted update, see the SOURCE_* constants
+        self.state_source = source
+        # time.monotonic() of the last update confirming the current state
+        self.last_updated = time.monotonic()
+        # Created on first use, most devices never get a direct subscriber
+        self._events = None
+        # time.monotonic() of the last change of the state field
+        self.state_changed_at = time.monotonic()
+        # FreshnessPolicy overriding the bridge's for this device
+        self.freshness = None
+        # Battery and signal history, when the bridge records telemetry
+        self.telemetry = None
+        if bridge.telemetry is not None:
+            self.telemetry = Telemetry(DEVICE_METRICS)
+            self.telemetry.record(self._state)
+
+    @property
+    def events(self):
+        if self._events is None:
+            self._events = EventEmitter()
+        return self._events
+
+    @property
+    def _json(self):
+        return self._state.to_dict()
 
     @property
     def name(self):
-        return self._json.get("name")
+        return self._state.name
 
     @property
     def nuki_id(self):
-        return self._json.get("nukiId")
+        return self._state.nuki_id
 
     @property
     def battery_critical(self):
-        return self._json.get("batteryCritical")
+        return self._state.battery_critical
 
     @property
     def firmware_version(self):
-        return self._json.get("firmwareVersion")
+        return self._state.firmware_version
 
     @property
     def state(self):
-        return self._json.get("state")
+        return self._state.state
 
     @property
     def state_name(self):
-        return self._json.get("stateName")
+        return self._state.state_name
+
+    @property
+    def state_age(self):
+        """Seconds since the state was last confirmed by any source"""
+        return time.monotonic() - self.last_updated
+
+    def is_fresh(self, max_age):
+        return self.state_age <= max_age
+
+    @property
+    def is_transitional(self):
+        # Whether the device is moving between two states, eg: unlocking
+        return False
 
     @property
     def device_type(self):
-        return self._json.get("deviceType")
+        return self._state.device_type
 
     @property
     def device_type_str(self):
-        dev = self.device_type
-        if dev == const.DEVICE_TYPE_LOCK:
-            return "lock"
-        elif dev == const.DEVICE_TYPE_OPENER:
-            return "opener"
-        logger.error(f"Unknown device type: {dev}")
-        return "UNKNOWN"
+        name = DEVICE_TYPE_NAMES.get(self._state.device_type)
+        if name is None:
+            logger.error(f"Unknown device type: {self.device_type}")
+            return "UNKNOWN"
+        return name
 
     @property
     def mode(self):
-        return self._json.get("mode")
+        return self._state.mode
 
     @property
     def mode_str(self):
-        dev = self.device_type
-        mode = self.mode
-        if dev == const.DEVICE_TYPE_LOCK:
-            if mode == const.MODE_LOCK_DOOR:
-                return "door mode"
-        elif dev == const.DEVICE_TYPE_OPENER:
-            if mode == const.MODE_OPENER_DOOR:
-                return "door mode"
-            elif mode == const.MODE_OPENER_CONTINUOUS:
-                return "continuous"
-        logger.error(f'Unknown mode "{mode}" for device type {dev}')
-        return "UNKNOWN"
-
-    async def update(self, json=None, aggressive=False):
+        dev = self._state.device_type
+        mode = self._state.mode
+        name = MODE_NAMES.get((dev, mode))
+        if name is None:
+            logger.error(f'Unknown mode "{mode}" for device type {dev}')
+            return "UNKNOWN"
+        return name
+
+    async def update(
+        self, json=None, aggressive=False, source=SOURCE_UPDATE, max_age=None
+    ):
         """
         Update the state of the Nuki device
         :param aggressive: Whether to aggressively poll the Bridge. If set to
         True, this will actively query the Lock instead of returning the Bridge's
-        last known status, thus using more battery.
-        :type aggressive: bool
+        last known status, thus using more battery. Queries are rationed by the
+        FreshnessPolicy, the Bridge's last known status is used once the
+        device's budget is exhausted. AGGRESSIVE_AUTO uses the cheapest source
+        satisfying max_age: the current state, the Bridge's last known status,
+        then querying the Lock if that status looks stale.
+        :type aggressive: bool or str
+        :param source: Origin of the json data, reported in the change events.
+        :type source: str
+        :param max_age: Skip the update if the state was confirmed less than
+        max_age seconds ago. Defaults to the policy's max_age with
+        AGGRESSIVE_AUTO.
+        :type max_age: float
         """
-        newdata = {}
+        policy = self.freshness_policy
+        auto = aggressive == AGGRESSIVE_AUTO
+        if auto and max_age is None:
+            max_age = policy.max_age
 
         if json:
-            newdata = json
-        elif aggressive:
-            data = await self._bridge.lock_state(self.nuki_id)
-            logger.debug(f"Received data: {data}")
-            if not data.get("success", False):
-                raise NukiUpdateException(
-                    f"Failed to update data for Nuki device {self.nuki_id}"
-                )
-            newdata = {k: v for k, v in data.items() if k != "success"}
+            self._apply(json, source)
+            return
+        if (
+            max_age is not None
+            and self.is_fresh(max_age)
+            and not (auto and policy.needs_lock_state(self))
+        ):
+            return
+
+        if auto:
+            await self._update_from_list()
+            if self.is_fresh(max_age) and not policy.needs_lock_state(self):
+                return
+        elif not aggressive:
+            await self._update_from_list()
+            return
+
+        if policy.spend(self):
+            await self._update_from_lock_state()
         else:
-            data = [
-                l
-                for l in await self._bridge._get_devices(self.device_type)
-                if l.nuki_id == self.nuki_id
-            ]
-            assert data, (
-                "Failed to update data for lock. " f"Nuki ID {self.nuki_id} volatized."
+            logger.info(f"lockState budget of {self} exhausted, using /list")
+            if not auto:
+                await self._update_from_list()
+
+    @property
+    def freshness_policy(self):
+        return self.freshness or self._bridge.freshness
+
+    async def _update_from_lock_state(self):
+        requested_at = time.monotonic()
+        data = await self._bridge.lock_state(self.nuki_id, self.device_type)
+        logger.debug(f"Received data: {data}")
+        if not data.get("success", False):
+            raise NukiUpdateException(
+                f"Failed to update data for Nuki device {self.nuki_id}"
             )
-            newdata = data[0]._json
+        newdata = {k: v for k, v in data.items() if k != "success"}
+        self._apply(newdata, SOURCE_LOCK_STATE, requested_at=requested_at)
+
+    async def _update_from_list(self):
+        await self._bridge._get_devices(self.device_type)
+        dev = self._bridge.registry.get(self.nuki_id, self.device_type)
+        assert dev, (
+            "Failed to update data for lock. " f"Nuki ID {self.nuki_id} volatized."
+        )
+        if dev is self:
+            # Already reconciled in place by the bridge
+            return
+        self._apply(dev._state.to_dict(), dev.state_source, dev.state_timestamp)
+
+    def matches(self, data):
+        """Whether data, eg: a callback payload, changes nothing on the device"""
+        state = self._state
+        return all(state.get(k, _MISSING) == v for k, v in data.items())
+
+    def _apply(self, data, source=SOURCE_UPDATE, timestamp=None, requested_at=None):
+        """
+        Merge data into the device, returning a dict with only the changed fields.
+        A StateChangeEvent is emitted to the device and bridge subscribers.
 
-        self._json.update(newdata)
+        Updates without a timestamp (callbacks, lockState) are stamped with the
+        bridge's time. Changes requested (time.monotonic()) before the current
+        state was received are rejected if their timestamp is older, or as old
+        since timestamps have a one second resolution.
+        """
+        if timestamp is None:
+            # The bridge's timestamps have a one second resolution
+            timestamp = self._bridge.now().replace(microsecond=0)
+        state = self._state
+        changed = {}
+        for k, v in data.items():
+            if state.get(k, _MISSING) != v:
+                changed[k] = v
+
+        if self.state_timestamp is None or timestamp > self.state_timestamp:
+            newer = True
+        elif timestamp == self.state_timestamp:
+            # Within the same second, the latest request wins
+            newer = requested_at is None or requested_at > self.last_updated
+        else:
+            newer = False
+        if (
+            changed
+            and not newer
+            and (requested_at is None or requested_at <= self.last_updated)
+        ):
+            # eg: a slow /list response arriving after a callback
+            logger.debug(f"Ignoring outdated {source} update for {self}: {changed}")
+            return {}
+
+        self.last_updated = time.monotonic()
+        if self.telemetry is not None:
+            self.telemetry.record(data)
+        if newer:
+            self.state_timestamp = timestamp
+        if newer or changed:
+            self.state_source = source
+        if not changed:
+            return changed
+        if "state" in changed:
+            self.state_changed_at = time.monotonic()
+
+        device_events = self._events
+        bridge_events = self._bridge.events
+        if (device_events is not None and device_events.has_subscribers) or (
+            bridge_events.has_subscribers
+        ):
+            previous = {k: state.get(k) for k in changed}
+            state.update(changed)
+            event = StateChangeEvent(self, changed, previous, source)
+            if device_events is not None:
+                device_events.emit(event)
+            bridge_events.emit(event)
+        else:
+            state.update(changed)
+        return changed
 
     def __repr__(self):
         return f"<{self.__class__.__name__}: {self._json}>"
@@ -0,0 +1,154 @@
+# coding: utf-8
+
+import asyncio
+import aiohttp
+import ipaddress
+import json
+import os
+import time
+
+from .utils import logger
+
+# Default values
+DISCOVERY_URL = "https://api.nuki.io/discover/bridges"
+DISCOVERY_TIMEOUT = 10
+DISCOVERY_CACHE_TTL = 24 * 3600
+PROBE_PORT = 8080
+PROBE_TIMEOUT = 1
+PROBE_CONCURRENCY = 64
+
+
+async def discover_cloud(timeout=DISCOVERY_TIMEOUT):
+    """
+    Ask the nuki.io discovery service for the bridges in this network.
+    Returns a list of dicts, eg: {'bridgeId': 2117604523, 'ip': '192.168.1.50', 'port': 8080}
+    """
+    # Use a sepparate session, doesn't make sense to use the cloud session for local reqs
+    async with aiohttp.ClientSession() as discoverSession:
+        async with discoverSession.get(
+            DISCOVERY_URL, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as res:
+            data = await res.json()
+            logger.debug(f"Discovery returned {data}")
+            error_code = data.get("errorCode", -9999)
+            if error_code != 0:
+                logger.error(f"Discovery failed with error code {error_code}")
+            return data.get("bridges") or []
+
+
+async def probe(session, host, port=PROBE_PORT, timeout=PROBE_TIMEOUT):
+    """
+    Whether a bridge seems to answer on host:port. Without a token the
+    bridge's /info answers 401, with a valid one it returns its bridgeType.
+    """
+    try:
+        async with session.get(
+            f"http://{host}:{port}/info", timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as res:
+            if res.status == 401:
+                return True
+            if res.status == 200:
+                data = await res.json(content_type=None)
+                return isinstance(data, dict) and "bridgeType" in data
+    except (asyncio.TimeoutError, aiohttp.ClientError, ValueError):
+        pass
+    return False
+
+
+async def discover_lan(
+    hosts,
+    port=PROBE_PORT,
+    timeout=PROBE_TIMEOUT,
+    concurrency=PROBE_CONCURRENCY,
+):
+    """
+    Probe hosts concurrently for bridges, without the cloud service.
+    hosts is either a network, eg: '192.168.1.0/24', or an iterable of hosts.
+    """
+    if isinstance(hosts, str):
+        hosts = [str(ip) for ip in ipaddress.ip_network(hosts, strict=False).hosts()]
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=True)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def check(host):
+            async with semaphore:
+                return await probe(session, host, port, timeout)
+
+        found = await asyncio.gather(*[check(h) for h in hosts])
+    bridges = [{"ip": h, "port": port} for h, ok in zip(hosts, found) if ok]
+    logger.debug(f"LAN discovery found {bridges}")
+    return bridges
+
+
+def cache_source(lan=None, port=PROBE_PORT):
+    """What a discovery searched, eg: 'cloud' or 'lan:192.168.1.0/24:8080'"""
+    if lan is None:
+        return "cloud"
+    if not isinstance(lan, str):
+        lan = ",".join(str(host) for host in lan)
+    return f"lan:{lan}:{port}"
+
+
+def load_cache(path, ttl=DISCOVERY_CACHE_TTL, source=None):
+    """
+    Return the cached discovery results, or None if missing, unreadable,
+    older than ttl or from another source than the given one, see
+    cache_source. A ttl of None accepts any age.
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("bridges"), list):
+        return None
+    if source is not None and data.get("source") != source:
+        return None
+    timestamp = data.get("timestamp")
+    if ttl is not None and not (
+        isinstance(timestamp, (int, float)) and time.time() - timestamp <= ttl
+    ):
+        return None
+    return data["bridges"]
+
+
+def save_cache(path, bridges, source=None):
+    # Write then rename, so readers never see a partial file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"timestamp": time.time(), "source": source, "bridges": bridges}, f)
+    os.replace(tmp, path)
+
+
+async def discover(cache_path=None, cache_ttl=DISCOVERY_CACHE_TTL, lan=None, **kwargs):
+    """
+    Discover bridges through the cloud service, or by probing the lan hosts
+    if given. Results are cached in cache_path, and an expired cache is still
+    used when discovery fails. The cache is only used for the same search.
+    """
+    if lan is not None and not isinstance(lan, str):
+        lan = list(lan)
+    source = cache_source(lan, kwargs.get("port", PROBE_PORT))
+    if cache_path:
+        cached = load_cache(cache_path, cache_ttl, source)
+        if cached is not None:
+            logger.debug(f"Using cached discovery results {cached}")
+            return cached
+
+    try:
+        if lan is not None:
+            bridges = await discover_lan(lan, **kwargs)
+        else:
+            bridges = await discover_cloud(**kwargs)
+    except (asyncio.TimeoutError, aiohttp.ClientError) as err:
+        expired = load_cache(cache_path, None, source) if cache_path else None
+        if expired is None:
+            raise
+        logger.warning(f"Discovery failed ({err!r}), using expired cache")
+        return expired
+
+    if cache_path and bridges:
+        save_cache(cache_path, bridges, source)
+    return bridges
@@ -0,0 +1,95 @@
+# coding: utf-8
+
+import asyncio
+from collections import namedtuple
+
+from .utils import logger
+
+# Where a state update came from
+SOURCE_LIST = "list"
+SOURCE_LOCK_STATE = "lockState"
+SOURCE_CALLBACK = "callback"
+SOURCE_UPDATE = "update"
+
+STREAM_MAXSIZE = 1000
+
+# changes holds the new value of every changed field, previous the old ones
+StateChangeEvent = namedtuple(
+    "StateChangeEvent", ["device", "changes", "previous", "source"]
+)
+
+
+class EventStream(object):
+    """
+    Async iterator over the events of an EventEmitter.
+    When the consumer falls behind by maxsize events, the oldest are dropped.
+    """
+
+    def __init__(self, emitter, maxsize=STREAM_MAXSIZE):
+        self._emitter = emitter
+        self._queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        emitter._streams.append(self)
+
+    def _put(self, event):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    def close(self):
+        if self in self._emitter._streams:
+            self._emitter._streams.remove(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._queue.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        self.close()
+
+
+class EventEmitter(object):
+    def __init__(self):
+        self._callbacks = []
+        self._streams = []
+
+    @property
+    def has_subscribers(self):
+        return bool(self._callbacks or self._streams)
+
+    def subscribe(self, callback):
+        """
+        Call callback(event) for every event, coroutine functions are scheduled.
+        Returns a function removing the subscription.
+        """
+        self._callbacks.append(callback)
+        return lambda: self._callbacks.remove(callback)
+
+    def stream(self, maxsize=STREAM_MAXSIZE):
+        return EventStream(self, maxsize)
+
+    async def __aiter__(self):
+        """
+        Events from a new stream, closed once the iteration stops, eg: with a
+        break. Use stream() directly to pick maxsize or check dropped.
+        """
+        async with self.stream() as stream:
+            async for event in stream:
+                yield event
+
+    def emit(self, event):
+        for callback in list(self._callbacks):
+            try:
+                res = callback(event)
+                if asyncio.iscoroutine(res):
+                    asyncio.ensure_future(res)
+            except Exception:
+                logger.exception(f"Event subscriber {callback} failed")
+        for stream in self._streams:
+            stream._put(event)
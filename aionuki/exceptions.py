@@ -11,3 +11,15 @@ class InvalidCredentialsException(Exception):
 
 class BridgeUninitializedException(Exception):
     pass
+
+
+class NukiActionException(Exception):
+    pass
+
+
+class NukiActionTimeoutException(NukiActionException):
+    pass
+
+
+class BridgeUnavailableException(Exception):
+    pass
@@ -0,0 +1,234 @@
+# coding: utf-8
+
+import asyncio
+import aiohttp
+
+from . import constants as const
+from .actions import BULK_CONCURRENCY, BulkResult
+from .bridge import NukiBridge
+from .events import EventEmitter
+from .snapshot import load_snapshot, save_snapshot
+from .utils import logger
+
+# Default values
+FLEET_CONCURRENCY = 32
+FLEET_TIMEOUT = 30
+CONNECTOR_LIMIT = 100
+DNS_CACHE_TTL = 300
+
+
+class NukiFleet(object):
+    """
+    A group of bridges sharing a single aiohttp connector.
+
+    Fleet wide operations run on every bridge with bounded concurrency. A
+    bridge failing or timing out is logged and reported in the results, it
+    never stalls or aborts the operation on the other bridges.
+    """
+
+    def __init__(
+        self,
+        bridges=None,
+        session=None,
+        concurrency=FLEET_CONCURRENCY,
+        timeout=FLEET_TIMEOUT,
+        connector_limit=CONNECTOR_LIMIT,
+    ):
+        self.session = session
+        self._own_session = session is None
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.connector_limit = connector_limit
+        self.bridges = {}
+        # Last error for every bridge that failed its latest fleet operation
+        self.failures = {}
+        # (nukiId, deviceType) and nukiId -> bridge, rebuilt on fleet refreshes
+        self._owners = {}
+        # State changes of the devices of every bridge
+        self.events = EventEmitter()
+        self._unsubscribe = {}
+        # Request hooks added to every bridge of the fleet
+        self.hooks = []
+
+        for br in bridges or []:
+            self.add(br)
+
+    def __repr__(self):
+        return f"<NukiFleet: {len(self.bridges)} bridges>"
+
+    def __len__(self):
+        return len(self.bridges)
+
+    def __iter__(self):
+        return iter(self.bridges.values())
+
+    async def startSession(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.connector_limit, ttl_dns_cache=DNS_CACHE_TTL
+        )
+        self.session = aiohttp.ClientSession(connector=connector)
+        self._own_session = True
+        for br in self:
+            br.session = self.session
+
+    async def endSession(self):
+        if self._own_session and self.session is not None:
+            await self.session.close()
+
+    async def __aenter__(self):
+        if self.session is None:
+            await self.startSession()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.endSession()
+
+    def add(self, bridge):
+        if bridge.session is None:
+            bridge.session = self.session
+        for hook in self.hooks:
+            if hook not in bridge.hooks:
+                bridge.add_hook(hook)
+        self.bridges[bridge.bridgeId] = bridge
+        if bridge.bridgeId not in self._unsubscribe:
+            self._unsubscribe[bridge.bridgeId] = bridge.events.subscribe(
+                self.events.emit
+            )
+        return bridge
+
+    def add_bridge(self, hostname, port=8080, **kwargs):
+        return self.add(NukiBridge(hostname, port=port, session=self.session, **kwargs))
+
+    def add_hook(self, hook):
+        """Add a RequestHooks instance to every current and future bridge"""
+        self.hooks.append(hook)
+        for br in self:
+            br.add_hook(hook)
+
+    def remove(self, bridge):
+        self.failures.pop(bridge.bridgeId, None)
+        unsubscribe = self._unsubscribe.pop(bridge.bridgeId, None)
+        if unsubscribe is not None:
+            unsubscribe()
+        return self.bridges.pop(bridge.bridgeId)
+
+    async def gather(self, fn, bridges=None):
+        """
+        Run the coroutine function fn(bridge) on every bridge.
+        Returns a dict of bridgeId to either the result or the raised exception.
+        """
+        if bridges is None:
+            bridges = list(self)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(br):
+            async with semaphore:
+                try:
+                    result = await asyncio.wait_for(fn(br), self.timeout)
+                except Exception as err:
+                    logger.warning(f"Fleet operation failed on {br}: {err!r}")
+                    self.failures[br.bridgeId] = err
+                    return err
+                self.failures.pop(br.bridgeId, None)
+                return result
+
+        results = await asyncio.gather(*[run(br) for br in bridges])
+        return {br.bridgeId: res for br, res in zip(bridges, results)}
+
+    async def connect(self):
+        results = await self.gather(lambda br: br.connect())
+        self._reindex()
+        return results
+
+    async def getDevices(self):
+        results = await self.gather(lambda br: br.getDevices())
+        self._reindex()
+        return results
+
+    async def info(self):
+        return await self.gather(lambda br: br.info())
+
+    async def ensure_fresh(self, max_age=None):
+        return await self.gather(lambda br: br.ensure_fresh(max_age))
+
+    async def bulk_action(
+        self,
+        action,
+        device_type=const.DEVICE_TYPE_LOCK,
+        where=None,
+        wait=False,
+        concurrency=BULK_CONCURRENCY,
+    ):
+        """
+        NukiBridge.bulk_action on every bridge in parallel, concurrency bounds
+        the actions in flight on each bridge. Returns the merged BulkResult.
+        """
+        result = BulkResult()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        # Not through gather: waiting for many actions can outlast its timeout,
+        # every action has its own timeout instead
+        async def run(br):
+            async with semaphore:
+                try:
+                    result.extend(
+                        await br.bulk_action(
+                            action, device_type, where, wait, concurrency
+                        )
+                    )
+                except Exception as err:
+                    logger.warning(f"Bulk action failed on {br}: {err!r}")
+                    result.errors[br.bridgeId] = err
+
+        await asyncio.gather(*[run(br) for br in self])
+        return result
+
+    async def lock_all(self, where=None, wait=False):
+        return await self.bulk_action(const.ACTION_LOCK_LOCK, where=where, wait=wait)
+
+    async def unlock_all(self, where=None, wait=False):
+        return await self.bulk_action(const.ACTION_LOCK_UNLOCK, where=where, wait=wait)
+
+    async def register_callbacks(self, server):
+        """Register every bridge of the fleet with a NukiCallbackServer."""
+        return await self.gather(server.register)
+
+    def save_snapshot(self, path):
+        save_snapshot(path, self)
+
+    def load_snapshot(self, path, revalidate=True, **kwargs):
+        """
+        Add the bridges saved at path with their devices, without any request.
+        When revalidate is set, they are refreshed in the background.
+        Keyword arguments are passed to every NukiBridge.
+        """
+        bridges = [self.add(br) for br in load_snapshot(path, **kwargs)]
+        self._reindex()
+        if revalidate:
+            asyncio.ensure_future(self.gather(lambda br: br._revalidate(), bridges))
+        return bridges
+
+    def _reindex(self):
+        owners = {}
+        for br in self:
+            for dev in br.registry:
+                owners[(dev.nuki_id, dev.device_type)] = br
+                owners[dev.nuki_id] = br
+        self._owners = owners
+
+    @property
+    def devices(self):
+        return [dev for br in self for dev in br.registry]
+
+    def getDevice(self, nuki_id, device_type=None):
+        key = nuki_id if device_type is None else (nuki_id, device_type)
+        br = self._owners.get(key)
+        dev = br.registry.get(nuki_id, device_type) if br else None
+        if dev is not None:
+            return dev
+        # Added since the last fleet refresh: fall back to asking every bridge
+        for br in self:
+            dev = br.registry.get(nuki_id, device_type)
+            if dev is not None:
+                return dev
+        return None
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+import time
+
+# Default values, in seconds
+MAX_AGE = 60
+# lockState queries allowed per device and budget period, each one wakes the
+# device over BLE. None doesn't ration them, explicit queries are honored
+LOCK_STATE_BUDGET = None
+BUDGET_PERIOD = 3600
+# A transitional state (eg: unlocking) lasting longer than this is stale
+STALE_AFTER = 60
+
+# NukiDevice.update(aggressive=AGGRESSIVE_AUTO) picks the cheapest source
+AGGRESSIVE_AUTO = "auto"
+
+
+class FreshnessPolicy(object):
+    """
+    How fresh device states must be, and what it may cost to get them.
+
+    max_age is the default age in seconds a state is acceptable for, callers
+    pass their own per use case. lockState queries are rationed per device
+    with a token bucket holding lock_state_budget queries, refilled over
+    budget_period. A None budget, the default, doesn't ration them.
+    """
+
+    def __init__(
+        self,
+        max_age=MAX_AGE,
+        lock_state_budget=LOCK_STATE_BUDGET,
+        budget_period=BUDGET_PERIOD,
+        stale_after=STALE_AFTER,
+    ):
+        self.max_age = max_age
+        self.lock_state_budget = lock_state_budget
+        self.budget_period = budget_period
+        self.stale_after = stale_after
+        # (nukiId, deviceType) -> [tokens, time.monotonic() of the last refill]
+        self._buckets = {}
+        # (nukiId, deviceType) -> time.monotonic() of the last lockState query
+        self._queried = {}
+
+    def _bucket(self, device):
+        key = (device.nuki_id, device.device_type)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.lock_state_budget, now]
+        else:
+            refill = (now - bucket[1]) * self.lock_state_budget / self.budget_period
+            bucket[0] = min(self.lock_state_budget, bucket[0] + refill)
+            bucket[1] = now
+        return bucket
+
+    def remaining(self, device):
+        """lockState queries device can get right now"""
+        if self.lock_state_budget is None:
+            return float("inf")
+        return int(self._bucket(device)[0])
+
+    def spend(self, device):
+        """Take a lockState query from device's budget, False if exhausted"""
+        if self.lock_state_budget is not None:
+            bucket = self._bucket(device)
+            if bucket[0] < 1:
+                return False
+            bucket[0] -= 1
+        self._queried[(device.nuki_id, device.device_type)] = time.monotonic()
+        return True
+
+    def needs_lock_state(self, device):
+        """
+        Whether the bridge's last known state of device can't be trusted,
+        eg: still unlocking long after the last change. A device stuck in that
+        state isn't queried again before stale_after either.
+        """
+        if not device.is_transitional:
+            return False
+        since = max(
+            device.state_changed_at,
+            self._queried.get((device.nuki_id, device.device_type), 0),
+        )
+        return time.monotonic() - since > self.stale_after
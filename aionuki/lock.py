@@ -20,6 +20,14 @@ class NukiLock(NukiDevice):
         else:
             return None
 
+    @property
+    def is_transitional(self):
+        return self.state in (
+            const.STATE_LOCK_UNLOCKING,
+            const.STATE_LOCK_LOCKING,
+            const.STATE_LOCK_UNLATCHING,
+        )
+
     @property
     def is_open(self):
         if self.door_sensor_state == const.STATE_DOORSENSOR_OPENED:
@@ -46,19 +54,19 @@ class NukiLock(NukiDevice):
 
     @property
     def door_sensor_state(self):
-        return self._json.get("doorsensorState")
+        return self._state.door_sensor_state
 
     @property
     def door_sensor_state_name(self):
-        return self._json.get("doorsensorStateName")
+        return self._state.door_sensor_state_name
 
     @property
     def battery_charge(self):
-        return self._json.get("batteryChargeState")
+        return self._state.battery_charge
 
     @property
     def battery_critical_keypad(self):
-        return self._json.get("keypadBatteryCritical")
+        return self._state.battery_critical_keypad
 
     async def lock(self, block=False):
         return await self._bridge.lock(nuki_id=self.nuki_id, block=block)
@@ -0,0 +1,174 @@
+# coding: utf-8
+
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import logger, parse_timestamp
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log (
+    bridge TEXT NOT NULL,
+    nuki_id INTEGER,
+    device_type INTEGER,
+    timestamp REAL NOT NULL,
+    type INTEGER,
+    action INTEGER,
+    name TEXT,
+    data TEXT NOT NULL,
+    UNIQUE (bridge, timestamp, data)
+);
+CREATE INDEX IF NOT EXISTS log_device ON log (nuki_id, device_type, timestamp);
+CREATE INDEX IF NOT EXISTS log_bridge ON log (bridge, timestamp);
+"""
+
+
+def _row(bridge_id, entry):
+    timestamp = parse_timestamp(entry.get("timestamp"))
+    return (
+        bridge_id,
+        entry.get("nukiId"),
+        entry.get("deviceType"),
+        timestamp.timestamp() if timestamp else 0,
+        entry.get("type"),
+        entry.get("action"),
+        entry.get("name"),
+        # Canonical, an entry is stored once however often it's fetched
+        json.dumps(entry, separators=(",", ":"), sort_keys=True),
+    )
+
+
+class LogStore(object):
+    """
+    Local, indexed copy of the bridges' logs in a SQLite database.
+
+    sync() only fetches the log entries newer than the stored ones, queries
+    never hit the bridge. SQLite runs on a dedicated thread, off the loop.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._db = None
+        # A single thread, sqlite connections can't be shared between threads
+        self._executor = ThreadPoolExecutor(1)
+
+    def __repr__(self):
+        return f"<LogStore: {self.path}>"
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def _newest(self, bridge_id):
+        """Rows at the newest stored timestamp of a bridge"""
+        db = self._connect()
+        rows = db.execute(
+            "SELECT timestamp, data FROM log WHERE bridge = ? AND timestamp = "
+            "(SELECT MAX(timestamp) FROM log WHERE bridge = ?)",
+            (bridge_id, bridge_id),
+        ).fetchall()
+        if not rows:
+            return None, set()
+        return rows[0][0], {row[1] for row in rows}
+
+    def _insert(self, bridge_id, entries):
+        db = self._connect()
+        with db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO log VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [_row(bridge_id, entry) for entry in entries],
+            )
+            return db.total_changes - before
+
+    async def add(self, bridge_id, entries):
+        """Store log entries of a bridge, returns how many were new"""
+        return await self._run(self._insert, bridge_id, entries)
+
+    async def sync(self, bridge, page_size=None):
+        """
+        Fetch and store the entries logged by bridge since the last sync.
+        Returns the number of new entries.
+        """
+        newest, seen = await self._run(self._newest, bridge.bridgeId)
+
+        def stop(entry):
+            if newest is None:
+                return False
+            row = _row(bridge.bridgeId, entry)
+            # Entries of the newest stored second may be new or already stored
+            return row[3] < newest or (row[3] == newest and row[7] in seen)
+
+        kwargs = {} if page_size is None else {"page_size": page_size}
+        entries = [entry async for entry in bridge.iter_log(stop=stop, **kwargs)]
+        # Pages shift when entries are logged while paging, entries fetched
+        # twice or already stored have the same bridge, timestamp and data
+        # and are ignored by the unique constraint
+        added = await self.add(bridge.bridgeId, entries)
+        logger.debug(f"Stored {added} new log entries of {bridge}")
+        return added
+
+    def _query(self, sql, params):
+        rows = self._connect().execute(sql, params).fetchall()
+        return [dict(json.loads(data), bridge=bridge) for bridge, data in rows]
+
+    async def query(
+        self,
+        bridge_id=None,
+        nuki_id=None,
+        device_type=None,
+        action=None,
+        name=None,
+        since=None,
+        until=None,
+        limit=None,
+    ):
+        """
+        Stored log entries matching every given criteria, newest first. since
+        and until are datetimes. Entries get the bridgeId they came from.
+
+        eg: who unlocked the door last week
+            await store.query(nuki_id=..., action=ACTION_LOCK_UNLOCK, since=...)
+        """
+        where = []
+        params = []
+        for column, value in (
+            ("bridge", bridge_id),
+            ("nuki_id", nuki_id),
+            ("device_type", device_type),
+            ("action", action),
+            ("name", name),
+        ):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            where.append("timestamp < ?")
+            params.append(until.timestamp())
+
+        sql = "SELECT bridge, data FROM log"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return await self._run(self._query, sql, params)
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
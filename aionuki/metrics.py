@@ -0,0 +1,161 @@
+# coding: utf-8
+
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds of the histogram buckets, +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class RequestContext(object):
+    """
+    Describes one attempt of a bridge request, passed to the hooks.
+    started_at is None for attempts rejected before being sent, eg: by the
+    circuit breaker.
+    """
+
+    __slots__ = (
+        "bridge",
+        "endpoint",
+        "priority",
+        "attempt",
+        "queued_at",
+        "started_at",
+        "ended_at",
+        "status",
+    )
+
+    def __init__(self, bridge, endpoint, priority, attempt):
+        self.bridge = bridge
+        self.endpoint = endpoint
+        self.priority = priority
+        self.attempt = attempt
+        self.queued_at = time.perf_counter()
+        self.started_at = None
+        self.ended_at = None
+        self.status = None
+
+    @property
+    def queue_time(self):
+        """Seconds spent waiting for a scheduler slot"""
+        return self.started_at - self.queued_at
+
+    @property
+    def duration(self):
+        """Seconds between sending the request and getting its response"""
+        return self.ended_at - self.started_at
+
+
+class RequestHooks(object):
+    """
+    Base class of the request hooks of a bridge, see NukiBridge.add_hook.
+    Hooks are called synchronously on the event loop and must be cheap.
+    """
+
+    def on_request_start(self, ctx):
+        pass
+
+    def on_request_end(self, ctx):
+        pass
+
+    def on_request_error(self, ctx, err):
+        pass
+
+
+class Histogram(object):
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+
+class MetricsCollector(RequestHooks):
+    """
+    Request counters and latency histograms labelled by bridge and endpoint,
+    exported in the Prometheus text format.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4"
+
+    def __init__(self, prefix="nuki"):
+        self.prefix = prefix
+        # (bridgeId, endpoint, result) -> count
+        self.requests = {}
+        # (bridgeId, endpoint) -> Histogram
+        self.durations = {}
+        self.queue_times = {}
+
+    def _observe(self, ctx, result):
+        key = (ctx.bridge.bridgeId, ctx.endpoint)
+        counter = key + (result,)
+        self.requests[counter] = self.requests.get(counter, 0) + 1
+        if ctx.started_at is None:
+            # Never sent, there's no latency to observe
+            return
+
+        duration = self.durations.get(key)
+        if duration is None:
+            duration = self.durations[key] = Histogram()
+            self.queue_times[key] = Histogram()
+        duration.observe(ctx.duration)
+        self.queue_times[key].observe(ctx.queue_time)
+
+    def on_request_end(self, ctx):
+        self._observe(ctx, "ok")
+
+    def on_request_error(self, ctx, err):
+        self._observe(ctx, type(err).__name__)
+
+    def _render_histogram(self, lines, name, help, histograms):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} histogram")
+        for (bridge, endpoint), h in sorted(histograms.items()):
+            labels = _labels(bridge=bridge, endpoint=endpoint)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), h.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+            lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+    def render(self):
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_requests_total Bridge requests by result",
+            f"# TYPE {p}_requests_total counter",
+        ]
+        for (bridge, endpoint, result), count in sorted(self.requests.items()):
+            labels = _labels(bridge=bridge, endpoint=endpoint, result=result)
+            lines.append(f"{p}_requests_total{{{labels}}} {count}")
+        self._render_histogram(
+            lines,
+            f"{p}_request_duration_seconds",
+            "Bridge request latency",
+            self.durations,
+        )
+        self._render_histogram(
+            lines,
+            f"{p}_request_queue_seconds",
+            "Time bridge requests waited for a scheduler slot",
+            self.queue_times,
+        )
+        return "\n".join(lines) + "\n"
+
+    async def handler(self, request):
+        """aiohttp handler serving the metrics, eg: on /metrics"""
+        from aiohttp import web
+
+        return web.Response(
+            body=self.render().encode(), headers={"Content-Type": self.CONTENT_TYPE}
+        )
@@ -10,13 +10,17 @@ class NukiOpener(NukiDevice):
     def is_rto_activated(self):
         return self.state == const.STATE_OPENER_RTO_ACTIVE
 
+    @property
+    def is_transitional(self):
+        return self.state in (const.STATE_OPENER_OPENING, const.STATE_OPENER_BOOT_RUN)
+
     @property
     def ring_action_timestamp(self):
-        return self._json.get("ringactionTimestamp")
+        return self._state.ring_action_timestamp
 
     @property
     def ring_action_state(self):
-        return self._json.get("ringactionState")
+        return self._state.ring_action_state
 
     async def activate_rto(self, block=False):
         return await self._bridge.lock_action(
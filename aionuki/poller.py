@@ -0,0 +1,117 @@
+# coding: utf-8
+
+import asyncio
+import random
+import time
+
+from .utils import logger
+
+# Default values, in seconds
+POLL_INTERVAL = 60
+# Used while callbacks keep arriving
+POLL_SLOW_INTERVAL = 600
+# Used for a while after an action was sent
+POLL_FAST_INTERVAL = 5
+CALLBACK_HEALTHY_WINDOW = 900
+ACTION_WINDOW = 30
+POLL_JITTER = 0.1
+
+
+class AdaptivePoller(object):
+    """
+    Background /list poller for a bridge.
+
+    Polls slowly while callbacks are arriving, at the normal interval once
+    they go quiet, and fast for a short while after an action. Intervals are
+    jittered so many bridges don't poll in lockstep. Devices whose state
+    looks stale to their FreshnessPolicy are then queried with lockState.
+    """
+
+    def __init__(
+        self,
+        bridge,
+        interval=POLL_INTERVAL,
+        slow_interval=POLL_SLOW_INTERVAL,
+        fast_interval=POLL_FAST_INTERVAL,
+        callback_window=CALLBACK_HEALTHY_WINDOW,
+        action_window=ACTION_WINDOW,
+        jitter=POLL_JITTER,
+    ):
+        self.bridge = bridge
+        self.interval = interval
+        self.slow_interval = slow_interval
+        self.fast_interval = fast_interval
+        self.callback_window = callback_window
+        self.action_window = action_window
+        self.jitter = jitter
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify_action(self):
+        """Switch to the fast interval right away."""
+        self._wakeup.set()
+
+    def base_interval(self):
+        now = time.monotonic()
+        last_action = self.bridge.last_action
+        last_callback = self.bridge.last_callback
+        if last_action is not None and now - last_action < self.action_window:
+            return self.fast_interval
+        if last_callback is not None and now - last_callback < self.callback_window:
+            return self.slow_interval
+        return self.interval
+
+    def next_interval(self):
+        return self.base_interval() * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def stale_devices(self):
+        return [
+            dev
+            for dev in self.bridge.registry
+            if dev.freshness_policy.needs_lock_state(dev)
+        ]
+
+    async def poll(self):
+        await self.bridge.refresh_devices()
+        for dev in self.stale_devices():
+            logger.debug(f"State looks stale, querying the device: {dev}")
+            await dev.update(aggressive=True)
+
+    async def _sleep(self, delay):
+        while True:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                return
+            # Woken up by an action: restart the wait with the fast interval
+            delay = self.next_interval()
+
+    async def _run(self):
+        # Random start offset spreads the polls of many bridges
+        await self._sleep(random.uniform(0, self.next_interval()))
+        while True:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning(f"Polling {self.bridge} failed: {err!r}")
+            await self._sleep(self.next_interval())
@@ -0,0 +1,108 @@
+# coding: utf-8
+
+from collections import namedtuple
+
+from . import constants as const
+from .device import NukiDevice
+from .events import SOURCE_LIST
+from .lock import NukiLock
+from .opener import NukiOpener
+from .utils import logger, parse_timestamp
+
+RegistryChanges = namedtuple("RegistryChanges", ["added", "removed"])
+
+
+def flatten_list_entry(entry):
+    """
+    Merge a /list entry and its lastKnownState into a single flat dict
+    eg: {'name': 'Home', 'nukiId': 241563832, 'state': 1, 'stateName': 'locked'}
+    Returns the dict and the parsed lastKnownState timestamp.
+    """
+    data = dict(entry)
+    timestamp = None
+    state = data.pop("lastKnownState", None)
+    if state:
+        data.update(state)
+        timestamp = parse_timestamp(data.pop("timestamp", None))
+    return data, timestamp
+
+
+class DeviceRegistry(object):
+    """
+    Devices managed by a bridge, keyed by (nukiId, deviceType).
+
+    Device objects keep their identity across refreshes: reconciling a new
+    /list response only applies the fields that changed to existing devices.
+    """
+
+    def __init__(self, bridge):
+        self._bridge = bridge
+        self._devices = {}
+        # Secondary index for lookups that don't carry a deviceType
+        self._by_id = {}
+        self.initialized = False
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __iter__(self):
+        return iter(self._devices.values())
+
+    def __contains__(self, key):
+        return key in self._devices
+
+    def get(self, nuki_id, device_type=None):
+        if device_type is None:
+            return self._by_id.get(nuki_id)
+        return self._devices.get((nuki_id, device_type))
+
+    def _create(self, data, timestamp, source):
+        dev_type = data.get("deviceType")
+        if dev_type == const.DEVICE_TYPE_LOCK:
+            cls = NukiLock
+        elif dev_type == const.DEVICE_TYPE_OPENER:
+            cls = NukiOpener
+        else:
+            logger.warning(f"Unknown device type: {dev_type}")
+            cls = NukiDevice
+        return cls(self._bridge, data, timestamp=timestamp, source=source)
+
+    def add(self, data, timestamp=None, source=SOURCE_LIST):
+        key = (data.get("nukiId"), data.get("deviceType"))
+        dev = self._create(data, timestamp, source)
+        self._devices[key] = dev
+        self._by_id[key[0]] = dev
+        return dev
+
+    def remove(self, key):
+        dev = self._devices.pop(key)
+        if self._by_id.get(key[0]) is dev:
+            del self._by_id[key[0]]
+        return dev
+
+    def reconcile(self, entries, device_type=None, requested_at=None):
+        """
+        Reconcile the registry against a list of (data, timestamp) tuples as
+        returned by flatten_list_entry.
+        When device_type is given, only devices of that type can be removed.
+        requested_at is the time.monotonic() the /list request was issued at.
+        """
+        seen = set()
+        added = []
+        for data, timestamp in entries:
+            key = (data.get("nukiId"), data.get("deviceType"))
+            seen.add(key)
+            dev = self._devices.get(key)
+            if dev is None:
+                added.append(self.add(data, timestamp))
+            else:
+                dev._apply(data, SOURCE_LIST, timestamp, requested_at)
+
+        stale = [
+            k
+            for k in self._devices
+            if k not in seen and (device_type is None or k[1] == device_type)
+        ]
+        removed = [self.remove(k) for k in stale]
+        self.initialized = True
+        return RegistryChanges(added, removed)
@@ -0,0 +1,98 @@
+# coding: utf-8
+
+import asyncio
+import aiohttp
+import random
+import time
+
+# The bridge answers 503 when it's busy, the request was not processed
+RETRY_STATUSES = (503,)
+
+# Endpoints that can be sent again without side effects
+IDEMPOTENT_ENDPOINTS = {"info", "list", "lockState", "log", "callback/list"}
+
+
+def is_bridge_failure(err):
+    """Whether err means the bridge is unreachable or unhealthy"""
+    if isinstance(err, aiohttp.ClientResponseError):
+        return err.status >= 500
+    return isinstance(err, (asyncio.TimeoutError, aiohttp.ClientConnectionError))
+
+
+class RetryPolicy(object):
+    """
+    Retries failed requests with exponential backoff and jitter.
+
+    Requests that were rejected before being processed (connection refused,
+    503) are always retried. Those that may have reached the bridge (timeouts,
+    dropped connections) are only retried when idempotent.
+    """
+
+    def __init__(self, attempts=3, backoff=0.5, max_backoff=8, jitter=0.5):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        delay = min(self.backoff * 2**attempt, self.max_backoff)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def should_retry(self, err, attempt, idempotent):
+        if attempt + 1 >= self.attempts:
+            return False
+        if isinstance(err, aiohttp.ClientResponseError):
+            return err.status in RETRY_STATUSES
+        if isinstance(err, aiohttp.ClientConnectorError):
+            # Never reached the bridge
+            return True
+        return idempotent and is_bridge_failure(err)
+
+
+class CircuitBreaker(object):
+    """
+    Fails fast while a bridge is down.
+
+    Opens after failure_threshold consecutive failures. Once reset_timeout
+    seconds passed, a single trial request is let through (half open): any
+    answer of the bridge, even an error status like 401, closes the circuit
+    again, a failure (see is_bridge_failure) keeps it open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = None
+
+    @property
+    def retry_in(self):
+        """Seconds until the next trial request is allowed"""
+        if self.state == self.CLOSED:
+            return 0
+        return max(0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        if self.state == self.CLOSED:
+            return True
+        # Also lets another trial through if the previous one never reported
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
@@ -0,0 +1,95 @@
+# coding: utf-8
+
+import asyncio
+import heapq
+import itertools
+
+# Lower values are served first
+PRIORITY_ACTION = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_POLL = 2
+
+
+class _Slot(object):
+    def __init__(self, scheduler, priority):
+        self._scheduler = scheduler
+        self._priority = priority
+
+    async def __aenter__(self):
+        await self._scheduler.acquire(self._priority)
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        self._scheduler.release()
+
+
+class RequestScheduler(object):
+    """
+    Serializes the requests sent to a single bridge.
+
+    At most `concurrency` requests run at the same time, waiting requests are
+    served by priority (then in arrival order), and consecutive requests are
+    started at least `min_interval` seconds apart.
+    """
+
+    def __init__(self, concurrency=1, min_interval=0):
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self._active = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._last_start = None
+        self._wakeup = None
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def pending(self):
+        return sum(1 for w in self._waiters if not w[2].done())
+
+    def slot(self, priority=PRIORITY_DEFAULT):
+        """Async context manager holding a request slot while in use."""
+        return _Slot(self, priority)
+
+    async def acquire(self, priority=PRIORITY_DEFAULT):
+        fut = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # Cancelled after being granted a slot: hand it to the next waiter.
+            # Otherwise the cancelled future is dropped lazily by _dispatch.
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        loop = asyncio.get_event_loop()
+        while self._waiters and self._active < self.concurrency:
+            fut = self._waiters[0][2]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            if self.min_interval and self._last_start is not None:
+                delay = self._last_start + self.min_interval - loop.time()
+                if delay > 0:
+                    if self._wakeup is None:
+                        self._wakeup = loop.call_later(delay, self._on_wakeup)
+                    return
+
+            heapq.heappop(self._waiters)
+            self._active += 1
+            self._last_start = loop.time()
+            fut.set_result(None)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
@@ -0,0 +1,64 @@
+# coding: utf-8
+
+import hashlib
+import time
+from random import getrandbits
+
+from yarl import URL
+
+
+class RequestBuilder(object):
+    """
+    Builds the signed urls of a bridge's requests.
+
+    Produces the same query strings as hash_token, without redoing the stable
+    work on every request: url prefixes are kept per endpoint, the timestamp is
+    formatted once per second, and the SHA-256 context already holding
+    "{ts}," is copied for every signature.
+    """
+
+    def __init__(self, base_url, token, secure=True, clock=time.time):
+        self.base_url = base_url
+        self.token = token
+        self.secure = secure
+        # Returns the current UTC time as seconds since the epoch
+        self.clock = clock
+        self._token_suffix = f",{token}".encode()
+        self._prefixes = {}
+        self._second = None
+        self._ts = None
+        self._ts_hash = None
+
+    def prefix(self, endpoint):
+        prefix = self._prefixes.get(endpoint)
+        if prefix is None:
+            prefix = self._prefixes[endpoint] = f"{self.base_url}/{endpoint}?"
+        return prefix
+
+    def _timestamp(self):
+        second = int(self.clock())
+        if second != self._second:
+            self._ts = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(second))
+            self._ts_hash = hashlib.sha256(f"{self._ts},".encode())
+            self._second = second
+        return self._ts
+
+    def auth_query(self):
+        if not self.secure:
+            return f"token={self.token}"
+        ts = self._timestamp()
+        rnr = getrandbits(16)
+        h = self._ts_hash.copy()
+        h.update(str(rnr).encode())
+        h.update(self._token_suffix)
+        return f"ts={ts}&rnr={rnr}&hash={h.hexdigest()}"
+
+    def url(self, endpoint, params=None):
+        """
+        Signed URL of endpoint. Like before, params are added as is and not
+        url-encoded, the bridge doesn't decode them.
+        """
+        query = self.auth_query()
+        if params:
+            query += "&" + "&".join(f"{k}={v}" for k, v in params.items())
+        return URL(self.prefix(endpoint) + query, encoded=True)
@@ -0,0 +1,101 @@
+# coding: utf-8
+
+import json
+import os
+import time
+
+from .bridge import NukiBridge
+from .utils import logger, parse_timestamp
+
+SNAPSHOT_VERSION = 1
+
+
+def dump_device(dev, now):
+    timestamp = dev.state_timestamp
+    return {
+        "data": dev._json,
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "source": dev.state_source,
+        "age": now - dev.last_updated,
+    }
+
+
+def dump_bridge(bridge):
+    """Compact, JSON serializable state of a bridge and its devices"""
+    now = time.monotonic()
+    info = bridge.cache.entry("info")
+    devices = None
+    if bridge.registry.initialized:
+        devices = [dump_device(dev, now) for dev in bridge.registry]
+    return {
+        "hostname": bridge.hostname,
+        "port": bridge.port,
+        "token": bridge.token,
+        "secure": bridge.secure,
+        "info": info.value if info else None,
+        "infoAge": info.age if info else None,
+        "devices": devices,
+    }
+
+
+def load_bridge(data, elapsed=0, **kwargs):
+    """
+    Build a bridge and its devices from dump_bridge's output without any
+    request. elapsed is the time in seconds since the snapshot was taken, it
+    ages the restored states and cached /info accordingly.
+    """
+    bridge = NukiBridge(
+        data["hostname"],
+        port=data["port"],
+        token=data.get("token"),
+        secure=data.get("secure", True),
+        **kwargs,
+    )
+    now = time.monotonic()
+    if data.get("info") is not None:
+        requested_at = now - data.get("infoAge", 0) - elapsed
+        bridge.cache.set("info", data["info"], requested_at)
+        bridge._json = data["info"]
+
+    if data.get("devices") is not None:
+        for d in data["devices"]:
+            dev = bridge.registry.add(
+                d["data"], parse_timestamp(d.get("timestamp")), d.get("source")
+            )
+            dev.last_updated = now - d.get("age", 0) - elapsed
+        bridge.registry.initialized = True
+    return bridge
+
+
+def save_snapshot(path, bridges):
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "savedAt": time.time(),
+        "bridges": [dump_bridge(br) for br in bridges],
+    }
+    # Holds the tokens: keep it private, and write then rename so readers
+    # never see a partial file
+    tmp = f"{path}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_snapshot(path, **kwargs):
+    """
+    Return the bridges saved in the snapshot at path, or [] if there's no
+    usable snapshot. Keyword arguments are passed to every NukiBridge.
+    """
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as err:
+        logger.info(f"No usable snapshot at {path}: {err!r}")
+        return []
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        logger.warning(f"Ignoring snapshot with version {snapshot.get('version')}")
+        return []
+
+    elapsed = max(0, time.time() - snapshot.get("savedAt", 0))
+    return [load_bridge(b, elapsed, **kwargs) for b in snapshot["bridges"]]
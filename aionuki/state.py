@@ -0,0 +1,166 @@
+# coding: utf-8
+
+"""
+Compact, parsed device state.
+
+Values of the enum fields are IntEnum members, they compare equal to the
+plain ints of the constants module. Values unknown to the enums are kept as
+plain ints.
+"""
+
+from enum import IntEnum
+
+from . import constants as const
+
+
+class DeviceType(IntEnum):
+    LOCK = const.DEVICE_TYPE_LOCK
+    OPENER = const.DEVICE_TYPE_OPENER
+
+
+class LockState(IntEnum):
+    UNCALIBRATED = const.STATE_LOCK_UNCALIBRATED
+    LOCKED = const.STATE_LOCK_LOCKED
+    UNLOCKING = const.STATE_LOCK_UNLOCKING
+    UNLOCKED = const.STATE_LOCK_UNLOCKED
+    LOCKING = const.STATE_LOCK_LOCKING
+    UNLATCHED = const.STATE_LOCK_UNLATCHED
+    UNLOCKED_LOCK_N_GO = const.STATE_LOCK_UNLOCKED_LOCK_N_GO
+    UNLATCHING = const.STATE_LOCK_UNLATCHING
+    MOTOR_BLOCKED = const.STATE_LOCK_MOTOR_BLOCKED
+    UNDEFINED = const.STATE_LOCK_UNDEFINED
+
+
+class OpenerState(IntEnum):
+    UNTRAINED = const.STATE_OPENER_UNTRAINED
+    ONLINE = const.STATE_OPENER_ONLINE
+    RTO_ACTIVE = const.STATE_OPENER_RTO_ACTIVE
+    OPEN = const.STATE_OPENER_OPEN
+    OPENING = const.STATE_OPENER_OPENING
+    BOOT_RUN = const.STATE_OPENER_BOOT_RUN
+    UNDEFINED = const.STATE_OPENER_UNDEFINED
+
+
+class LockMode(IntEnum):
+    DOOR = const.MODE_LOCK_DOOR
+
+
+class OpenerMode(IntEnum):
+    DOOR = const.MODE_OPENER_DOOR
+    CONTINUOUS = const.MODE_OPENER_CONTINUOUS
+
+
+class DoorSensorState(IntEnum):
+    DEACTIVATED = const.STATE_DOORSENSOR_DEACTIVATED
+    CLOSED = const.STATE_DOORSENSOR_CLOSED
+    OPENED = const.STATE_DOORSENSOR_OPENED
+    UNKNOWN = const.STATE_DOORSENSOR_UNKNOWN
+    CALIBRATING = const.STATE_DOORSENSOR_CALIBRATING
+
+
+STATE_ENUMS = {
+    const.DEVICE_TYPE_LOCK: LockState,
+    const.DEVICE_TYPE_OPENER: OpenerState,
+}
+
+MODE_ENUMS = {
+    const.DEVICE_TYPE_LOCK: LockMode,
+    const.DEVICE_TYPE_OPENER: OpenerMode,
+}
+
+DEVICE_TYPE_NAMES = {
+    const.DEVICE_TYPE_LOCK: "lock",
+    const.DEVICE_TYPE_OPENER: "opener",
+}
+
+MODE_NAMES = {
+    (const.DEVICE_TYPE_LOCK, const.MODE_LOCK_DOOR): "door mode",
+    (const.DEVICE_TYPE_OPENER, const.MODE_OPENER_DOOR): "door mode",
+    (const.DEVICE_TYPE_OPENER, const.MODE_OPENER_CONTINUOUS): "continuous",
+}
+
+
+def _enum(cls, value):
+    # Much cheaper than cls(value) and its ValueError for unknown values
+    return cls._value2member_map_.get(value, value)
+
+
+# JSON key -> attribute
+FIELDS = {
+    "nukiId": "nuki_id",
+    "deviceType": "device_type",
+    "name": "name",
+    "firmwareVersion": "firmware_version",
+    "mode": "mode",
+    "state": "state",
+    "stateName": "state_name",
+    "batteryCritical": "battery_critical",
+    "batteryCharging": "battery_charging",
+    "batteryChargeState": "battery_charge",
+    "keypadBatteryCritical": "battery_critical_keypad",
+    "doorsensorState": "door_sensor_state",
+    "doorsensorStateName": "door_sensor_state_name",
+    "ringactionTimestamp": "ring_action_timestamp",
+    "ringactionState": "ring_action_state",
+}
+
+
+class DeviceState(object):
+    """
+    State of a lock or an opener, parsed once from /list entries, lockState
+    responses and callbacks. Keys without a field are kept in extra.
+    Fields that were never received are None.
+    """
+
+    __slots__ = tuple(FIELDS.values()) + ("extra",)
+
+    def __init__(self, data=None):
+        for attr in self.__slots__:
+            setattr(self, attr, None)
+        if data:
+            self.update(data)
+
+    def get(self, key, default=None):
+        attr = FIELDS.get(key)
+        if attr is not None:
+            value = getattr(self, attr)
+        elif self.extra is not None:
+            value = self.extra.get(key)
+        else:
+            value = None
+        return default if value is None else value
+
+    def update(self, data):
+        if "deviceType" in data:
+            self.device_type = _enum(DeviceType, data["deviceType"])
+        for key, value in data.items():
+            attr = FIELDS.get(key)
+            if attr is None:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+            elif key == "state":
+                enum = STATE_ENUMS.get(self.device_type)
+                self.state = value if enum is None else _enum(enum, value)
+            elif key == "mode":
+                enum = MODE_ENUMS.get(self.device_type)
+                self.mode = value if enum is None else _enum(enum, value)
+            elif key == "doorsensorState":
+                self.door_sensor_state = _enum(DoorSensorState, value)
+            elif key != "deviceType":
+                setattr(self, attr, value)
+
+    def to_dict(self):
+        """The state as the bridge's JSON, eg: {'nukiId': 1, 'state': 1, ...}"""
+        data = {}
+        for key, attr in FIELDS.items():
+            value = getattr(self, attr)
+            if value is not None:
+                # Plain ints, as received
+                data[key] = int(value) if isinstance(value, IntEnum) else value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self):
+        return f"<DeviceState: {self.to_dict()}>"
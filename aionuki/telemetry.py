@@ -0,0 +1,178 @@
+# coding: utf-8
+
+"""
+In-memory telemetry of devices and bridges, eg: battery charge over time.
+
+Every metric is a Series of array backed ring buffers: the raw samples, and
+their per-minute and per-hour averages. Old samples are overwritten, memory
+stays bounded whatever the uptime.
+"""
+
+import time
+from array import array
+
+# Metrics recorded from the device states
+DEVICE_METRICS = ("batteryChargeState", "batteryCritical", "keypadBatteryCritical")
+# Metrics recorded from /info, the rssi of every device is recorded in its own
+# telemetry from scanResults
+BRIDGE_METRICS = ("uptime", "wlanConnected", "serverConnected")
+
+# (name, bucket seconds, capacity), 0 seconds keeps the raw samples
+RESOLUTIONS = (
+    ("raw", 0, 128),
+    ("minute", 60, 360),
+    ("hour", 3600, 24 * 14),
+)
+
+
+class RingBuffer(object):
+    """Fixed capacity (time, value) samples, the oldest being overwritten"""
+
+    __slots__ = ("capacity", "times", "values", "_start")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # Grown up to capacity, so rarely updated metrics stay small
+        self.times = array("d")
+        self.values = array("d")
+        self._start = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, t, value):
+        if len(self.times) < self.capacity:
+            self.times.append(t)
+            self.values.append(value)
+        else:
+            self.times[self._start] = t
+            self.values[self._start] = value
+            self._start = (self._start + 1) % self.capacity
+
+    def __iter__(self):
+        """Samples from the oldest to the newest"""
+        n = len(self.times)
+        for i in range(n):
+            j = (self._start + i) % n
+            yield self.times[j], self.values[j]
+
+    @property
+    def oldest(self):
+        return self.times[self._start] if self.times else None
+
+    def covers(self, since):
+        """Whether every sample since then is still held"""
+        if len(self.times) < self.capacity:
+            # Nothing was overwritten yet
+            return True
+        return self.times[self._start] <= since
+
+
+class Series(object):
+    """A metric's samples at every resolution of RESOLUTIONS"""
+
+    __slots__ = ("buffers", "_buckets", "last")
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.buffers = {name: RingBuffer(capacity) for name, _, capacity in resolutions}
+        # Bucket being averaged per downsampled resolution:
+        # name -> [seconds, bucket start, sum, count]
+        self._buckets = {
+            name: [seconds, None, 0.0, 0] for name, seconds, _ in resolutions if seconds
+        }
+        self.last = None
+
+    def record(self, value, t=None):
+        if t is None:
+            t = time.time()
+        value = float(value)
+        self.last = (t, value)
+        self.buffers["raw"].append(t, value)
+        for name, bucket in self._buckets.items():
+            seconds, start, total, count = bucket
+            bucket_start = t - t % seconds
+            if start is not None and bucket_start != start:
+                self.buffers[name].append(start, total / count)
+                total = count = 0
+            bucket[1:] = [bucket_start, total + value, count + 1]
+
+    def points(self, since=None, resolution=None):
+        """
+        (time, value) samples newer than since, oldest first. Without a
+        resolution, the finest one still holding samples since then is used.
+        Downsampled samples include the bucket being filled.
+        """
+        if resolution is None:
+            for name in self.buffers:
+                if since is None or self.buffers[name].covers(since):
+                    resolution = name
+                    break
+            else:
+                resolution = name
+        points = list(self.buffers[resolution])
+        bucket = self._buckets.get(resolution)
+        if bucket is not None and bucket[3]:
+            points.append((bucket[1], bucket[2] / bucket[3]))
+        if since is not None:
+            points = [p for p in points if p[0] >= since]
+        return points
+
+    def rate(self, window=None, resolution=None):
+        """
+        Least squares slope of the samples of the last window seconds, in
+        units per second, or None without two distinct sample times.
+        """
+        since = None if window is None else time.time() - window
+        points = self.points(since, resolution)
+        n = len(points)
+        if n < 2:
+            return None
+        mean_t = sum(t for t, _ in points) / n
+        mean_v = sum(v for _, v in points) / n
+        var = sum((t - mean_t) ** 2 for t, _ in points)
+        if not var:
+            return None
+        return sum((t - mean_t) * (v - mean_v) for t, v in points) / var
+
+
+class Telemetry(object):
+    """Series of a device or a bridge, by metric name"""
+
+    __slots__ = ("metrics", "series")
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.series = {}
+
+    def __getitem__(self, name):
+        return self.series[name]
+
+    def __contains__(self, name):
+        return name in self.series
+
+    def record(self, data, t=None):
+        """Record the metrics present in data, eg: a device state update"""
+        if t is None:
+            t = time.time()
+        for name in self.metrics:
+            value = data.get(name)
+            if value is not None:
+                self.record_value(name, value, t)
+
+    def record_value(self, name, value, t=None):
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = Series()
+        series.record(value, t)
+
+    def latest(self):
+        return {name: s.last[1] for name, s in self.series.items()}
+
+    def drain_rate(self, name="batteryChargeState", window=7 * 86400):
+        """
+        Decrease of the metric per day over the last window seconds, eg: the
+        battery drain in percent per day. None without enough samples.
+        """
+        series = self.series.get(name)
+        rate = series.rate(window) if series is not None else None
+        return None if rate is None else -rate * 86400
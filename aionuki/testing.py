@@ -0,0 +1,447 @@
+# coding: utf-8
+
+"""
+In-process fake Nuki bridge, for tests and benchmarks.
+"""
+
+import asyncio
+import aiohttp
+import random
+import time
+from aiohttp import web
+from datetime import datetime, timezone
+from email.utils import formatdate
+
+from . import constants as const
+from .utils import logger, sha256sum
+
+LOCK_STATE_NAMES = {
+    const.STATE_LOCK_UNCALIBRATED: "uncalibrated",
+    const.STATE_LOCK_LOCKED: "locked",
+    const.STATE_LOCK_UNLOCKING: "unlocking",
+    const.STATE_LOCK_UNLOCKED: "unlocked",
+    const.STATE_LOCK_LOCKING: "locking",
+    const.STATE_LOCK_UNLATCHED: "unlatched",
+    const.STATE_LOCK_UNLOCKED_LOCK_N_GO: "unlocked (lock 'n' go)",
+    const.STATE_LOCK_UNLATCHING: "unlatching",
+    const.STATE_LOCK_MOTOR_BLOCKED: "motor blocked",
+    const.STATE_LOCK_UNDEFINED: "undefined",
+}
+
+OPENER_STATE_NAMES = {
+    const.STATE_OPENER_UNTRAINED: "untrained",
+    const.STATE_OPENER_ONLINE: "online",
+    const.STATE_OPENER_RTO_ACTIVE: "rto active",
+    const.STATE_OPENER_OPEN: "open",
+    const.STATE_OPENER_OPENING: "opening",
+    const.STATE_OPENER_BOOT_RUN: "boot run",
+    const.STATE_OPENER_UNDEFINED: "undefined",
+}
+
+# (field, value) steps a device goes through for every action, like the
+# real devices: transitional states first, then the resting state
+ACTION_SEQUENCES = {
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_UNLOCK): (
+        ("state", const.STATE_LOCK_UNLOCKING),
+        ("state", const.STATE_LOCK_UNLOCKED),
+    ),
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_LOCK): (
+        ("state", const.STATE_LOCK_LOCKING),
+        ("state", const.STATE_LOCK_LOCKED),
+    ),
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_UNLATCH): (
+        ("state", const.STATE_LOCK_UNLATCHING),
+        ("state", const.STATE_LOCK_UNLATCHED),
+        ("state", const.STATE_LOCK_UNLOCKED),
+    ),
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_LOCK_N_GO): (
+        ("state", const.STATE_LOCK_UNLOCKING),
+        ("state", const.STATE_LOCK_UNLOCKED_LOCK_N_GO),
+        ("state", const.STATE_LOCK_LOCKING),
+        ("state", const.STATE_LOCK_LOCKED),
+    ),
+    (const.DEVICE_TYPE_LOCK, const.ACTION_LOCK_LOCK_N_GO_WITH_UNLATCH): (
+        ("state", const.STATE_LOCK_UNLATCHING),
+        ("state", const.STATE_LOCK_UNLATCHED),
+        ("state", const.STATE_LOCK_UNLOCKED_LOCK_N_GO),
+        ("state", const.STATE_LOCK_LOCKING),
+        ("state", const.STATE_LOCK_LOCKED),
+    ),
+    (const.DEVICE_TYPE_OPENER, const.ACTION_OPENER_ACTIVATE_RTO): (
+        ("state", const.STATE_OPENER_RTO_ACTIVE),
+    ),
+    (const.DEVICE_TYPE_OPENER, const.ACTION_OPENER_DEACTIVATE_RTO): (
+        ("state", const.STATE_OPENER_ONLINE),
+    ),
+    (const.DEVICE_TYPE_OPENER, const.ACTION_OPENER_ELECTRIC_STRIKE_ACTUATION): (
+        ("state", const.STATE_OPENER_OPENING),
+        ("state", const.STATE_OPENER_OPEN),
+        ("state", const.STATE_OPENER_ONLINE),
+    ),
+    (const.DEVICE_TYPE_OPENER, const.ACTION_OPENER_ACTIVATE_CONTINUOUS): (
+        ("mode", const.MODE_OPENER_CONTINUOUS),
+    ),
+    (const.DEVICE_TYPE_OPENER, const.ACTION_OPENER_DEACTIVATE_CONTINUOUS): (
+        ("mode", const.MODE_OPENER_DOOR),
+    ),
+}
+
+# Accepted difference between the signed and the fake bridge's time
+HASH_TS_TOLERANCE = 60
+
+
+def _timestamp():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+class FakeNukiBridge(object):
+    """
+    aiohttp app implementing the bridge HTTP API for a set of fake devices.
+
+    :param latency: seconds every request takes to be processed
+    :param serial: process one request at a time, like the real bridge
+    :param reject_when_busy: answer 503 instead of queuing when serial and busy
+    :param error_rate: fraction of the requests randomly answered with 503
+    :param check_hash: validate hashed tokens (ts, rnr, hash) like the bridge
+    :param action_duration: seconds an action takes to go through its states,
+        see ACTION_SEQUENCES. noWait=0 actions hold the request meanwhile
+    """
+
+    def __init__(
+        self,
+        token="fake-token",
+        host="127.0.0.1",
+        port=0,
+        latency=0,
+        serial=True,
+        reject_when_busy=False,
+        error_rate=0,
+        check_hash=True,
+        action_duration=0,
+    ):
+        self.token = token
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.serial = serial
+        self.reject_when_busy = reject_when_busy
+        self.error_rate = error_rate
+        self.check_hash = check_hash
+        self.action_duration = action_duration
+        # Offset in seconds applied to the fake bridge's clock
+        self.clock_offset = 0
+
+        self.devices = {}
+        self.callbacks = []
+        self.log_entries = []
+        self.requests = 0
+        self.rejected = 0
+        self._lock = asyncio.Lock()
+        self._runner = None
+        self._session = None
+        # Last callback sent, callbacks are posted one after the other
+        self._posting = None
+        # Actions going through their states
+        self._playing = set()
+        self._started = time.monotonic()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def add_device(
+        self,
+        nuki_id,
+        device_type=const.DEVICE_TYPE_LOCK,
+        name=None,
+        state=None,
+        **fields,
+    ):
+        if state is None:
+            state = (
+                const.STATE_LOCK_LOCKED
+                if device_type == const.DEVICE_TYPE_LOCK
+                else const.STATE_OPENER_ONLINE
+            )
+        dev = {
+            "deviceType": device_type,
+            "nukiId": nuki_id,
+            "name": name or f"Device {nuki_id}",
+            "firmwareVersion": "2.8.15",
+            "state": {"mode": 2, "batteryCritical": False},
+            "timestamp": _timestamp(),
+        }
+        if device_type == const.DEVICE_TYPE_LOCK:
+            dev["state"].update(
+                {
+                    "batteryCharging": False,
+                    "batteryChargeState": 85,
+                    "keypadBatteryCritical": False,
+                    "doorsensorState": const.STATE_DOORSENSOR_CLOSED,
+                    "doorsensorStateName": "door closed",
+                }
+            )
+        dev["state"].update(fields)
+        self.devices[(nuki_id, device_type)] = dev
+        self.set_state(nuki_id, device_type, state=state)
+        return dev
+
+    def set_state(
+        self, nuki_id, device_type=const.DEVICE_TYPE_LOCK, notify=False, **fields
+    ):
+        """Change a device's state, optionally pushing it to the callbacks."""
+        dev = self.devices[(nuki_id, device_type)]
+        dev["state"].update(fields)
+        names = (
+            LOCK_STATE_NAMES
+            if device_type == const.DEVICE_TYPE_LOCK
+            else OPENER_STATE_NAMES
+        )
+        dev["state"]["stateName"] = names.get(dev["state"].get("state"), "undefined")
+        dev["timestamp"] = _timestamp()
+        if notify:
+            self.notify(nuki_id, device_type)
+
+    def notify(self, nuki_id, device_type=const.DEVICE_TYPE_LOCK):
+        dev = self.devices[(nuki_id, device_type)]
+        payload = {"deviceType": device_type, "nukiId": nuki_id, **dev["state"]}
+        for cb in self.callbacks:
+            self._posting = asyncio.ensure_future(
+                self._post(cb["url"], payload, self._posting)
+            )
+
+    async def _post(self, url, payload, previous=None):
+        # Keep the order of the state changes, like the bridge
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            async with self._session.post(url, json=payload) as res:
+                await res.read()
+        except aiohttp.ClientError as err:
+            logger.debug(f"Fake bridge callback to {url} failed: {err!r}")
+
+    # Server lifecycle
+
+    def make_app(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/info", self._info)
+        app.router.add_get("/list", self._list)
+        app.router.add_get("/lockState", self._lock_state)
+        app.router.add_get("/lockAction", self._lock_action)
+        app.router.add_get("/lock", self._simple_action)
+        app.router.add_get("/unlock", self._simple_action)
+        app.router.add_get("/callback/add", self._callback_add)
+        app.router.add_get("/callback/list", self._callback_list)
+        app.router.add_get("/callback/remove", self._callback_remove)
+        app.router.add_get("/log", self._log)
+        return app
+
+    async def start(self):
+        self._session = aiohttp.ClientSession()
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Resolve the actual port when started on port 0
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        for task in list(self._playing):
+            task.cancel()
+        if self._playing:
+            await asyncio.wait(self._playing)
+        if self._posting is not None:
+            await asyncio.wait([self._posting])
+            self._posting = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.stop()
+
+    # Request handling
+
+    def _authorized(self, query):
+        if "token" in query:
+            return query["token"] == self.token
+        if not self.check_hash:
+            return True
+        try:
+            ts = datetime.strptime(query["ts"], "%Y-%m-%dT%H:%M:%SZ")
+            rnr = query["rnr"]
+            digest = query["hash"]
+        except (KeyError, ValueError):
+            return False
+        now = datetime.utcnow().timestamp() + self.clock_offset
+        if abs(now - ts.timestamp()) > HASH_TS_TOLERANCE:
+            return False
+        return sha256sum(f"{query['ts']},{rnr},{self.token}") == digest
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        res = await self._respond(request, handler)
+        # Like the bridge, answer with the time of the (possibly drifted) clock
+        res.headers["Date"] = formatdate(time.time() + self.clock_offset, usegmt=True)
+        return res
+
+    async def _respond(self, request, handler):
+        self.requests += 1
+        if self.error_rate and random.random() < self.error_rate:
+            self.rejected += 1
+            return web.Response(status=503)
+        if not self._authorized(request.query):
+            return web.Response(status=401)
+        if not self.serial:
+            return await self._process(request, handler)
+        if self.reject_when_busy and self._lock.locked():
+            self.rejected += 1
+            return web.Response(status=503)
+        async with self._lock:
+            return await self._process(request, handler)
+
+    async def _process(self, request, handler):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    def _device(self, request):
+        query = request.query
+        key = (
+            int(query["nukiId"]),
+            int(query.get("deviceType", const.DEVICE_TYPE_LOCK)),
+        )
+        return self.devices.get(key)
+
+    async def _info(self, request):
+        now = datetime.utcnow().timestamp() + self.clock_offset
+        return web.json_response(
+            {
+                "bridgeType": const.BRIDGE_TYPE_HW,
+                "ids": {"hardwareId": 12345678, "serverId": 87654321},
+                "versions": {
+                    "firmwareVersion": "2.11.0",
+                    "wifiFirmwareVersion": "2.2.0",
+                },
+                "uptime": int(time.monotonic() - self._started),
+                "currentTime": datetime.utcfromtimestamp(now).strftime(
+                    "%Y-%m-%dT%H:%M:%SZ"
+                ),
+                "wlanConnected": True,
+                "serverConnected": True,
+                "scanResults": [
+                    {
+                        "deviceType": dev["deviceType"],
+                        "nukiId": dev["nukiId"],
+                        "name": dev["name"],
+                        "rssi": -60,
+                        "paired": True,
+                    }
+                    for dev in self.devices.values()
+                ],
+            }
+        )
+
+    async def _list(self, request):
+        return web.json_response(
+            [
+                {
+                    "deviceType": dev["deviceType"],
+                    "nukiId": dev["nukiId"],
+                    "name": dev["name"],
+                    "firmwareVersion": dev["firmwareVersion"],
+                    "lastKnownState": {**dev["state"], "timestamp": dev["timestamp"]},
+                }
+                for dev in self.devices.values()
+            ]
+        )
+
+    async def _lock_state(self, request):
+        dev = self._device(request)
+        if dev is None:
+            return web.Response(status=404)
+        return web.json_response({**dev["state"], "success": True})
+
+    async def _play(self, dev, steps):
+        delay = self.action_duration / len(steps)
+        for field, value in steps:
+            if delay:
+                await asyncio.sleep(delay)
+            self.set_state(
+                dev["nukiId"], dev["deviceType"], notify=True, **{field: value}
+            )
+
+    async def _run_action(self, request, dev, action):
+        steps = ACTION_SEQUENCES.get((dev["deviceType"], action))
+        if steps is None:
+            return web.Response(status=400)
+        self.log_entries.insert(
+            0,
+            {
+                "timestamp": _timestamp(),
+                "type": 3,
+                "nukiId": dev["nukiId"],
+                "deviceType": dev["deviceType"],
+                "name": "Fake user",
+                "action": action,
+                "trigger": 0,
+                "completionStatus": 0,
+            },
+        )
+        playing = asyncio.ensure_future(self._play(dev, steps))
+        self._playing.add(playing)
+        playing.add_done_callback(self._playing.discard)
+        if request.query.get("noWait", "0") == "0":
+            await playing
+        return web.json_response({"success": True, "batteryCritical": False})
+
+    async def _lock_action(self, request):
+        dev = self._device(request)
+        if dev is None:
+            return web.Response(status=404)
+        return await self._run_action(request, dev, int(request.query["action"]))
+
+    async def _simple_action(self, request):
+        dev = self._device(request)
+        if dev is None:
+            return web.Response(status=404)
+        action = (
+            const.ACTION_LOCK_LOCK
+            if request.path == "/lock"
+            else const.ACTION_LOCK_UNLOCK
+        )
+        return await self._run_action(request, dev, action)
+
+    async def _callback_add(self, request):
+        url = request.query.get("url")
+        if not url or len(self.callbacks) >= 3:
+            return web.json_response({"success": False, "message": "invalid url"})
+        if any(cb["url"] == url for cb in self.callbacks):
+            return web.json_response({"success": False, "message": "duplicate url"})
+        self.callbacks.append({"id": len(self.callbacks), "url": url})
+        return web.json_response({"success": True})
+
+    async def _callback_list(self, request):
+        return web.json_response({"callbacks": self.callbacks})
+
+    async def _callback_remove(self, request):
+        callback_id = int(request.query.get("id", -1))
+        if not 0 <= callback_id < len(self.callbacks):
+            return web.json_response({"success": False, "message": "invalid id"})
+        del self.callbacks[callback_id]
+        # Ids are list indexes on the bridge
+        for i, cb in enumerate(self.callbacks):
+            cb["id"] = i
+        return web.json_response({"success": True})
+
+    async def _log(self, request):
+        offset = int(request.query.get("offset", 0))
+        count = int(request.query.get("count", 100))
+        return web.json_response(self.log_entries[offset : offset + count])
@@ -1,9 +1,10 @@
 # coding: utf-8
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from random import randint
 import hashlib
 import logging
+import socket
 
 
 logger = logging.getLogger("pynuki")
@@ -18,3 +19,40 @@ def hash_token(token):
     ts = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
     hash_256 = sha256sum(f"{ts},{rnr},{token}")
     return {"ts": ts, "rnr": rnr, "hash": hash_256}
+
+
+def parse_timestamp(value):
+    """
+    Parse a bridge timestamp, eg: 2018-10-03T06:49:00+00:00, into an aware
+    UTC datetime. Returns None if it can't be parsed.
+    """
+    if not value:
+        return None
+    try:
+        ts = datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return None
+
+    tz = value[19:].lstrip(".0123456789")  # Skip fractional seconds
+    offset = timedelta(0)
+    if tz and tz != "Z":
+        try:
+            hours, minutes = int(tz[1:3]), int(tz[-2:])
+        except ValueError:
+            return None
+        offset = timedelta(hours=hours, minutes=minutes)
+        if tz[0] == "-":
+            offset = -offset
+    return (ts - offset).replace(tzinfo=timezone.utc)
+
+
+def get_local_ip():
+    # Doesn't send anything, just picks the interface routing to a LAN address
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(("10.255.255.255", 1))
+        return s.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+    finally:
+        s.close()
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+"""
+Throughput and latency of the request path against an in-process fake bridge.
+
+    python benchmarks/bench_requests.py --save baseline.json
+    python benchmarks/bench_requests.py --compare baseline.json --threshold 1.2
+
+With --compare, exits with status 1 when the p50 or p99 latency of any
+benchmark got slower than threshold times the baseline.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+
+# Run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aionuki import NukiBridge, NukiCallbackServer
+from aionuki.freshness import FreshnessPolicy
+from aionuki.testing import FakeNukiBridge
+
+CALLBACK_PORT = 7124
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+async def measure(name, fn, iterations, concurrency=1):
+    """Run fn() iterations times with the given concurrency."""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run():
+        async with semaphore:
+            start = time.perf_counter()
+            await fn()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run() for _ in range(iterations)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "name": name,
+        "ops": iterations / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+async def bench(args):
+    results = []
+    fake = FakeNukiBridge(latency=args.latency)
+    for i in range(args.devices):
+        fake.add_device(1000 + i)
+
+    async with fake:
+        bridge = NukiBridge(
+            fake.host,
+            fake.port,
+            token=fake.token,
+            # Measure the request path, not the response cache
+            cache_ttls={"list": (0, 0), "info": (0, 0)},
+            # nor the lockState budget
+            freshness=FreshnessPolicy(lock_state_budget=None),
+        )
+        async with bridge:
+            await bridge.connect()
+            dev = bridge.managedDevices[0]
+            n = args.iterations
+
+            results.append(
+                await measure("__rq lockState", lambda: dev.update(aggressive=True), n)
+            )
+            results.append(await measure("getDevices", bridge.getDevices, n))
+            results.append(await measure("NukiDevice.update", dev.update, n))
+            # Concurrent updates of every device share their /list requests
+            results.append(
+                await measure(
+                    "NukiDevice.update concurrent",
+                    dev.update,
+                    n,
+                    concurrency=args.devices,
+                )
+            )
+
+            payload = {"deviceType": 0, "nukiId": dev.nuki_id, "state": 1}
+
+            async def interpret():
+                payload["state"] = 4 - payload["state"]
+                await bridge.interpret_callback(payload)
+
+            results.append(await measure("interpret_callback", interpret, n * 100))
+
+            async with NukiCallbackServer(
+                host="127.0.0.1", port=CALLBACK_PORT
+            ) as server:
+                await server.register(bridge, add_callback=False)
+                url = server.url_for(bridge)
+                async with aiohttp.ClientSession() as session:
+
+                    async def post():
+                        async with session.post(url, json=payload) as res:
+                            await res.read()
+
+                    results.append(
+                        await measure("callback ingestion", post, n * 10, 16)
+                    )
+                await server.join()
+
+    return results
+
+
+def report(results, baseline=None, threshold=None):
+    regressions = []
+    baseline = {r["name"]: r for r in baseline or []}
+    print(f"{'benchmark':32} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for r in results:
+        line = (
+            f"{r['name']:32} {r['ops']:10.1f} "
+            f"{r['p50'] * 1000:10.3f} {r['p99'] * 1000:10.3f}"
+        )
+        base = baseline.get(r["name"])
+        if base:
+            ratio = max(r["p50"] / base["p50"], r["p99"] / base["p99"])
+            line += f"  x{ratio:.2f}"
+            if threshold and ratio > threshold:
+                regressions.append(r["name"])
+                line += "  REGRESSION"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="fake bridge latency (s)"
+    )
+    parser.add_argument("--save", help="write the results to this json file")
+    parser.add_argument("--compare", help="baseline json file")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+
+    results = asyncio.get_event_loop().run_until_complete(bench(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from aionuki import NukiBridge, NukiCallbackServer
+from aionuki import constants as const
+from aionuki.testing import FakeNukiBridge
+
+ACTIONS = [
+    (const.DEVICE_TYPE_LOCK, const.STATE_LOCK_LOCKED, const.ACTION_LOCK_UNLATCH),
+    (const.DEVICE_TYPE_LOCK, const.STATE_LOCK_LOCKED, const.ACTION_LOCK_LOCK_N_GO),
+    (
+        const.DEVICE_TYPE_LOCK,
+        const.STATE_LOCK_LOCKED,
+        const.ACTION_LOCK_LOCK_N_GO_WITH_UNLATCH,
+    ),
+    (
+        const.DEVICE_TYPE_OPENER,
+        const.STATE_OPENER_ONLINE,
+        const.ACTION_OPENER_ELECTRIC_STRIKE_ACTUATION,
+    ),
+]
+
+
+async def _run_action(device_type, state, action, callbacks):
+    async with FakeNukiBridge(action_duration=0.1) as fake:
+        fake.add_device(1, device_type, state=state)
+        async with NukiCallbackServer(host="127.0.0.1", port=0) as server:
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                br.actions.timeout = 5
+                # Slower than the action, the transitional states are missed
+                br.actions.poll_interval = 0.3
+                await br.connect()
+                if callbacks:
+                    await server.register(br)
+                res = await br.lock_action(1, action, device_type, block=True)
+                return res, br.registry.get(1, device_type).state
+
+
+@pytest.mark.parametrize("device_type,state,action", ACTIONS)
+def test_blocking_action_with_callbacks(run, device_type, state, action):
+    res, _ = run(_run_action(device_type, state, action, callbacks=True))
+    assert res["success"]
+
+
+@pytest.mark.parametrize("device_type,state,action", ACTIONS)
+def test_blocking_action_polling_only(run, device_type, state, action):
+    res, final = run(_run_action(device_type, state, action, callbacks=False))
+    assert res["success"]
+    # Seen back in its resting state through /list
+    assert final in (
+        const.STATE_LOCK_LOCKED,
+        const.STATE_LOCK_UNLOCKED,
+        const.STATE_OPENER_ONLINE,
+    )
+
+
+def test_blocking_action_polling_only_latency(run):
+    async def main():
+        async with FakeNukiBridge(action_duration=0.2) as fake:
+            fake.add_device(1, state=const.STATE_LOCK_LOCKED)
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                await br.connect()
+                start = time.monotonic()
+                await br.lock_action(1, const.ACTION_LOCK_UNLOCK, block=True)
+                return time.monotonic() - start, br.registry.get(1).state
+
+    elapsed, state = run(main())
+    assert state == const.STATE_LOCK_UNLOCKED
+    # About the motor time, not a whole poll interval
+    assert elapsed < 1
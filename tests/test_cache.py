@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from aionuki import NukiBridge
+from aionuki.cache import ResponseCache
+from aionuki.testing import FakeNukiBridge
+
+
+async def _bridge(fake, **kwargs):
+    br = NukiBridge(fake.host, fake.port, token=fake.token, **kwargs)
+    await br.startSession()
+    return br
+
+
+def test_fresh_response_served_from_cache(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            async with await _bridge(fake) as br:
+                first = await br.info()
+                second = await br.info()
+                return first is second, fake.requests
+
+    assert run(main()) == (True, 1)
+
+
+def test_stale_response_served_while_revalidated(run):
+    async def main():
+        async with FakeNukiBridge(latency=0.05) as fake:
+            async with await _bridge(fake, cache_ttls={"list": (0.2, 10)}) as br:
+                fake.add_device(1)
+                first = await br.list()
+                fake.add_device(2)
+                await asyncio.sleep(0.25)
+                # Stale: answered right away, refreshed in the background
+                stale = await br.list()
+                await asyncio.sleep(0.1)
+                fresh = await br.list()
+                return len(first), len(stale), len(fresh), fake.requests
+
+    assert run(main()) == (1, 1, 2, 2)
+
+
+def test_expired_response_fetched_again(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            async with await _bridge(fake, cache_ttls={"list": (0.05, 0)}) as br:
+                fake.add_device(1)
+                await br.list()
+                fake.add_device(2)
+                await asyncio.sleep(0.1)
+                return len(await br.list()), fake.requests
+
+    assert run(main()) == (2, 2)
+
+
+def test_concurrent_fetches_share_one_request(run):
+    async def main():
+        async with FakeNukiBridge(latency=0.05) as fake:
+            async with await _bridge(fake) as br:
+                results = await asyncio.gather(*[br.list() for _ in range(5)])
+                return all(r is results[0] for r in results), fake.requests
+
+    assert run(main()) == (True, 1)
+
+
+def test_response_invalidated_in_flight_is_not_stored(run):
+    async def main():
+        async with FakeNukiBridge(latency=0.1) as fake:
+            fake.add_device(1)
+            async with await _bridge(fake) as br:
+                fetching = asyncio.ensure_future(br.list())
+                await asyncio.sleep(0.05)
+                # eg: a callback reporting a change the response may predate
+                br.cache.invalidate("list")
+                devices = await fetching
+                return len(devices), br.cache.entry("list")
+
+    assert run(main()) == (1, None)
+
+
+def test_failed_fetch_is_not_stored(run):
+    async def main():
+        cache = ResponseCache({"key": (10, 0)})
+        calls = []
+
+        async def fetch():
+            calls.append(None)
+            if len(calls) == 1:
+                raise ValueError("failed")
+            return "value"
+
+        with pytest.raises(ValueError):
+            await cache.get("key", fetch)
+        assert cache.entry("key") is None
+        return await cache.get("key", fetch), await cache.get("key", fetch), calls
+
+    assert run(main()) == ("value", "value", [None, None])
@@ -0,0 +1,121 @@
+import asyncio
+
+import aiohttp
+
+from aionuki import NukiBridge, NukiCallbackServer
+from aionuki import constants as const
+from aionuki.callback import CallbackCoalescer
+from aionuki.testing import FakeNukiBridge
+
+
+def test_ensure_callbacks_reports_failed_adds(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.callbacks.append({"id": 0, "url": "http://other/0"})
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                urls = [f"http://host/{i}" for i in range(3)]
+                res = await br.ensure_callbacks(urls, remove_others=False)
+                requests = fake.requests
+                again = await br.ensure_callbacks(urls, remove_others=False)
+                return res, again, requests, fake
+
+    res, again, requests, fake = run(main())
+    assert res == {
+        "added": ["http://host/0", "http://host/1"],
+        "removed": [],
+        # Beyond the bridge's 3 callbacks, not even sent
+        "failed": ["http://host/2"],
+    }
+    assert [cb["url"] for cb in fake.callbacks] == [
+        "http://other/0",
+        "http://host/0",
+        "http://host/1",
+    ]
+    assert again["added"] == [] and again["failed"] == ["http://host/2"]
+    # list, then two adds
+    assert requests == 3
+
+
+def test_ensure_callbacks_reports_rejected_adds(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                return await br.ensure_callbacks(["", "http://host/0"])
+
+    res = run(main())
+    assert res == {"added": ["http://host/0"], "removed": [], "failed": [""]}
+
+
+def test_callback_matching_an_older_callback_is_applied(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1, state=const.STATE_LOCK_LOCKED)
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                await br.connect()
+                coalescer = CallbackCoalescer(NukiCallbackServer._interpret)
+                dev = br.registry.get(1)
+                unlocked = {**fake.devices[(1, 0)]["state"], "nukiId": 1}
+                unlocked.update(
+                    deviceType=0, state=const.STATE_LOCK_UNLOCKED, stateName="unlocked"
+                )
+                await coalescer.submit(br, unlocked)
+                # Sent twice by the bridge
+                br.last_callback = dev.last_updated = 0
+                await coalescer.submit(br, dict(unlocked))
+                duplicates = coalescer.duplicates
+                # Dropped, but still a sign of life
+                assert br.last_callback > 0 and dev.last_updated > 0
+                assert dev.is_fresh(1)
+                # Locked through an action, then unlocked by hand
+                fake.set_state(1, state=const.STATE_LOCK_LOCKED)
+                br.cache.invalidate("list")
+                await br.refresh_devices()
+                await coalescer.submit(br, dict(unlocked))
+                return duplicates, dev.state
+
+    assert run(main()) == (1, const.STATE_LOCK_UNLOCKED)
+
+
+def test_callbacks_only_accepted_from_the_bridge(run):
+    async def main():
+        payload = {"nukiId": 1, "deviceType": 0, "state": 3}
+        async with NukiCallbackServer(host="127.0.0.1", port=0) as server:
+            local = NukiBridge("127.0.0.1", token="token")
+            remote = NukiBridge("192.0.2.1", token="token")
+            await server.register(local, add_callback=False)
+            await server.register(remote, add_callback=False)
+            statuses = []
+            async with aiohttp.ClientSession() as session:
+                for br in (local, remote):
+                    url = server.url_for(br)
+                    async with session.post(url, json=payload) as res:
+                        statuses.append(res.status)
+            return statuses, server.received
+
+    assert run(main()) == ([200, 403], 1)
+
+
+def test_stop_applies_queued_callbacks(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1, state=const.STATE_LOCK_LOCKED)
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                await br.connect()
+                server = NukiCallbackServer(host="127.0.0.1", port=0)
+                await server.start()
+                await server.register(br, add_callback=False)
+                interpret = br.interpret_callback
+
+                async def slow_interpret(data):
+                    await asyncio.sleep(0.05)
+                    await interpret(data)
+
+                br.interpret_callback = slow_interpret
+                for state in (const.STATE_LOCK_UNLOCKING, const.STATE_LOCK_UNLOCKED):
+                    server._queue.put_nowait(
+                        (br, {"nukiId": 1, "deviceType": 0, "state": state})
+                    )
+                await server.stop()
+                return br.registry.get(1).state
+
+    assert run(main()) == const.STATE_LOCK_UNLOCKED
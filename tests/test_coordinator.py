@@ -0,0 +1,61 @@
+import asyncio
+
+from aionuki import NukiBridge
+from aionuki import constants as const
+from aionuki.coordinator import UpdateCoordinator
+from aionuki.retry import CircuitBreaker, RetryPolicy
+from aionuki.testing import FakeNukiBridge
+
+
+def test_missing_devices_back_off(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1)
+            fake.add_device(2)
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                await br.connect()
+                coordinator = UpdateCoordinator(br, min_interval=0.01)
+                coordinator.register(0.3, [br.registry.get(2)])
+                del fake.devices[(2, const.DEVICE_TYPE_LOCK)]
+                br.cache.invalidate("list")
+                await br.refresh_devices()
+                coordinator.start()
+                await asyncio.sleep(0.5)
+                await coordinator.stop()
+                return coordinator.refreshes
+
+    # Looked for again once per max_age, not every min_interval
+    assert 1 <= run(main()) <= 2
+
+
+async def _refreshes_of_dead_bridge(breaker, duration=0.5):
+    fake = FakeNukiBridge()
+    fake.add_device(1)
+    async with fake:
+        br = NukiBridge(
+            fake.host,
+            fake.port,
+            token=fake.token,
+            cache_ttls={"list": (0, 0)},
+            read_retry=RetryPolicy(attempts=1),
+            breaker=breaker,
+        )
+        await br.connect()
+    async with br:
+        coordinator = UpdateCoordinator(br, min_interval=0.01)
+        coordinator.register(0.01)
+        coordinator.start()
+        await asyncio.sleep(duration)
+        await coordinator.stop()
+        return coordinator.refreshes
+
+
+def test_failed_refreshes_back_off(run):
+    breaker = CircuitBreaker(failure_threshold=1000)
+    # 0.02, 0.04, 0.08... instead of every 0.01
+    assert run(_refreshes_of_dead_bridge(breaker)) <= 6
+
+
+def test_failed_refreshes_wait_for_the_breaker(run):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    assert run(_refreshes_of_dead_bridge(breaker)) == 2
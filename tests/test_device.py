@@ -0,0 +1,52 @@
+import time
+
+from aionuki import NukiBridge
+from aionuki import constants as const
+from aionuki.events import SOURCE_CALLBACK, SOURCE_LIST
+
+
+def _lock(state=const.STATE_LOCK_LOCKED):
+    br = NukiBridge("127.0.0.1", token="token")
+    return br.registry.add({"nukiId": 1, "deviceType": 0, "state": state})
+
+
+def test_list_requested_before_a_callback_of_the_same_second_is_ignored():
+    dev = _lock(const.STATE_LOCK_LOCKED)
+    requested_at = time.monotonic()
+    dev._apply({"state": const.STATE_LOCK_UNLOCKED}, SOURCE_CALLBACK)
+    # The /list response was produced while unlocking, in the same second
+    changed = dev._apply(
+        {"state": const.STATE_LOCK_UNLOCKING},
+        SOURCE_LIST,
+        dev.state_timestamp,
+        requested_at,
+    )
+    assert changed == {}
+    assert dev.state == const.STATE_LOCK_UNLOCKED
+    assert dev.state_source == SOURCE_CALLBACK
+
+
+def test_list_requested_after_a_callback_of_the_same_second_is_applied():
+    dev = _lock(const.STATE_LOCK_LOCKED)
+    dev._apply({"state": const.STATE_LOCK_UNLOCKED}, SOURCE_CALLBACK)
+    changed = dev._apply(
+        {"state": const.STATE_LOCK_LOCKING},
+        SOURCE_LIST,
+        dev.state_timestamp,
+        time.monotonic(),
+    )
+    assert changed == {"state": const.STATE_LOCK_LOCKING}
+
+
+def test_older_list_is_ignored():
+    dev = _lock(const.STATE_LOCK_LOCKED)
+    requested_at = time.monotonic()
+    dev._apply({"state": const.STATE_LOCK_UNLOCKED}, SOURCE_CALLBACK)
+    older = dev.state_timestamp.replace(year=2000)
+    assert (
+        dev._apply(
+            {"state": const.STATE_LOCK_UNLOCKING}, SOURCE_LIST, older, requested_at
+        )
+        == {}
+    )
+    assert dev.state == const.STATE_LOCK_UNLOCKED
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from aionuki import discovery
+from aionuki.testing import FakeNukiBridge
+
+
+@pytest.mark.parametrize("content", ["[]", "null", '{"bridges": 1}', "{", ""])
+def test_unusable_cache_is_ignored(tmp_path, content):
+    path = tmp_path / "bridges.json"
+    path.write_text(content)
+    assert discovery.load_cache(str(path)) is None
+    assert discovery.load_cache(str(path), ttl=None) is None
+
+
+def test_cache_is_only_used_for_the_same_search(tmp_path):
+    path = str(tmp_path / "bridges.json")
+    bridges = [{"ip": "192.168.1.50", "port": 8080}]
+    lan = discovery.cache_source("192.168.1.0/24")
+    discovery.save_cache(path, bridges, lan)
+    assert discovery.load_cache(path, source=lan) == bridges
+    assert discovery.load_cache(path, source=discovery.cache_source()) is None
+    other = discovery.cache_source("10.0.0.0/24")
+    assert discovery.load_cache(path, source=other) is None
+
+
+def test_discover_lan_caches_per_search(run, tmp_path):
+    path = str(tmp_path / "bridges.json")
+
+    async def main():
+        async with FakeNukiBridge() as fake:
+            found = await discovery.discover(
+                cache_path=path, lan=[fake.host], port=fake.port
+            )
+            cached = json.load(open(path))
+            # Another network isn't answered from the cache
+            other = await discovery.discover(
+                cache_path=path, lan=["127.0.0.2"], port=fake.port, timeout=0.2
+            )
+            return fake.port, found, cached, other
+
+    port, found, cached, other = run(main())
+    assert found == [{"ip": "127.0.0.1", "port": port}]
+    assert cached["source"] == f"lan:127.0.0.1:{port}"
+    assert other == []
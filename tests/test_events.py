@@ -0,0 +1,43 @@
+import asyncio
+
+from aionuki.events import EventEmitter, StateChangeEvent
+
+
+def _event(state):
+    return StateChangeEvent(None, {"state": state}, {"state": None}, "callback")
+
+
+def test_iteration_closes_its_stream(run):
+    async def main():
+        emitter = EventEmitter()
+        received = []
+
+        async def consume():
+            async for event in emitter:
+                received.append(event.changes["state"])
+                if len(received) == 2:
+                    break
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0)
+        subscribed = emitter.has_subscribers
+        for state in (1, 2, 3):
+            emitter.emit(_event(state))
+        await task
+        # The generator is finalized in the background
+        await asyncio.sleep(0)
+        return subscribed, received, emitter.has_subscribers
+
+    assert run(main()) == (True, [1, 2], False)
+
+
+def test_stream_drops_oldest_events(run):
+    async def main():
+        emitter = EventEmitter()
+        async with emitter.stream(maxsize=2) as stream:
+            for state in (1, 2, 3):
+                emitter.emit(_event(state))
+            first = await stream.__anext__()
+            return first.changes["state"], stream.dropped, emitter.has_subscribers
+
+    assert run(main()) == (2, 1, True)
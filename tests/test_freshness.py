@@ -0,0 +1,26 @@
+from aionuki import MetricsCollector, NukiBridge
+from aionuki.freshness import FreshnessPolicy
+from aionuki.testing import FakeNukiBridge
+
+
+async def _lock_state_requests(calls, **kwargs):
+    metrics = MetricsCollector()
+    async with FakeNukiBridge() as fake:
+        fake.add_device(1)
+        async with NukiBridge(
+            fake.host, fake.port, token=fake.token, hooks=[metrics], **kwargs
+        ) as br:
+            await br.connect()
+            dev = br.registry.get(1)
+            for _ in range(calls):
+                await dev.update(aggressive=True)
+            return metrics.requests.get((br.bridgeId, "lockState", "ok"), 0)
+
+
+def test_explicit_queries_not_rationed_by_default(run):
+    assert run(_lock_state_requests(15)) == 15
+
+
+def test_queries_rationed_with_a_budget(run):
+    policy = FreshnessPolicy(lock_state_budget=10)
+    assert run(_lock_state_requests(15, freshness=policy)) == 10
@@ -0,0 +1,46 @@
+from aionuki import NukiBridge
+from aionuki import constants as const
+from aionuki.logstore import LogStore
+from aionuki.testing import FakeNukiBridge
+
+# Bridge events have no device, action or name
+BRIDGE_ENTRY = {"timestamp": "2024-03-01T10:00:00+00:00", "type": 1}
+
+
+def test_entries_without_device_stored_once(run):
+    async def main():
+        store = LogStore()
+        try:
+            first = await store.add("bridge", [BRIDGE_ENTRY])
+            # Same entry, another key order
+            again = await store.add("bridge", [dict(reversed(BRIDGE_ENTRY.items()))])
+            return first, again, len(await store.query())
+        finally:
+            await store.close()
+
+    assert run(main()) == (1, 0, 1)
+
+
+def test_sync_fetches_new_entries_only(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1)
+            store = LogStore()
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                await br.connect()
+                await br.lock_action(1, const.ACTION_LOCK_UNLOCK)
+                fake.log_entries.append(BRIDGE_ENTRY)
+                first = await store.sync(br, page_size=1)
+                await br.lock_action(1, const.ACTION_LOCK_LOCK)
+                second = await store.sync(br, page_size=1)
+                third = await store.sync(br, page_size=1)
+                entries = await store.query(nuki_id=1)
+            await store.close()
+            return first, second, third, sorted(e["action"] for e in entries)
+
+    assert run(main()) == (
+        2,
+        1,
+        0,
+        sorted([const.ACTION_LOCK_LOCK, const.ACTION_LOCK_UNLOCK]),
+    )
@@ -0,0 +1,33 @@
+import pytest
+
+from aionuki import MetricsCollector, NukiBridge
+from aionuki.exceptions import BridgeUnavailableException
+from aionuki.retry import CircuitBreaker, RetryPolicy
+from aionuki.testing import FakeNukiBridge
+
+
+def test_breaker_rejections_reach_the_hooks(run):
+    async def main():
+        metrics = MetricsCollector()
+        async with FakeNukiBridge(error_rate=1) as fake:
+            async with NukiBridge(
+                fake.host,
+                fake.port,
+                token=fake.token,
+                read_retry=RetryPolicy(attempts=1),
+                breaker=CircuitBreaker(failure_threshold=1),
+                hooks=[metrics],
+            ) as br:
+                with pytest.raises(Exception):
+                    await br.list()
+                with pytest.raises(BridgeUnavailableException):
+                    await br.list()
+                requests = fake.requests
+                return br.bridgeId, metrics, requests
+
+    bridge_id, metrics, requests = run(main())
+    assert requests == 1
+    assert metrics.requests[(bridge_id, "list", "BridgeUnavailableException")] == 1
+    # Only the request sent has a latency
+    assert metrics.durations[(bridge_id, "list")].count == 1
+    assert "BridgeUnavailableException" in metrics.render()
@@ -0,0 +1,46 @@
+import asyncio
+
+from aionuki import NukiBridge
+from aionuki import constants as const
+from aionuki.freshness import FreshnessPolicy
+from aionuki.poller import AdaptivePoller
+from aionuki.testing import FakeNukiBridge
+
+
+def test_stuck_device_queried_once_per_stale_after(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1, state=const.STATE_LOCK_UNLOCKING)
+            async with NukiBridge(
+                fake.host,
+                fake.port,
+                token=fake.token,
+                cache_ttls={"list": (0, 0)},
+                freshness=FreshnessPolicy(stale_after=0.1),
+            ) as br:
+                await br.connect()
+                poller = AdaptivePoller(br)
+                counts = []
+                for delay in (0, 0.15, 0, 0.15):
+                    await asyncio.sleep(delay)
+                    requests = fake.requests
+                    await poller.poll()
+                    counts.append(fake.requests - requests)
+                return counts
+
+    # /list, plus lockState once the state got stale again
+    assert run(main()) == [1, 2, 1, 2]
+
+
+def test_stale_rule_follows_the_device_policy(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1, state=const.STATE_LOCK_UNLOCKING)
+            fake.add_device(2, state=const.STATE_LOCK_UNLOCKING)
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                await br.connect()
+                br.registry.get(2).freshness = FreshnessPolicy(stale_after=0)
+                await asyncio.sleep(0.01)
+                return [dev.nuki_id for dev in AdaptivePoller(br).stale_devices()]
+
+    assert run(main()) == [2]
@@ -0,0 +1,81 @@
+from aionuki import NukiBridge, NukiLock, NukiOpener
+from aionuki import constants as const
+from aionuki.registry import flatten_list_entry
+from aionuki.testing import FakeNukiBridge
+
+
+def test_flatten_list_entry():
+    data, timestamp = flatten_list_entry(
+        {
+            "nukiId": 1,
+            "deviceType": 0,
+            "name": "Home",
+            "lastKnownState": {
+                "state": 1,
+                "stateName": "locked",
+                "timestamp": "2024-03-01T10:00:00+00:00",
+            },
+        }
+    )
+    assert data == {
+        "nukiId": 1,
+        "deviceType": 0,
+        "name": "Home",
+        "state": 1,
+        "stateName": "locked",
+    }
+    assert timestamp.isoformat() == "2024-03-01T10:00:00+00:00"
+
+
+def test_refresh_keeps_devices_and_reports_changes(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1)
+            fake.add_device(2)
+            # Same nukiId, another device type
+            fake.add_device(1, const.DEVICE_TYPE_OPENER)
+            async with NukiBridge(
+                fake.host, fake.port, token=fake.token, cache_ttls={"list": (0, 0)}
+            ) as br:
+                first = await br.refresh_devices()
+                lock = br.registry.get(1, const.DEVICE_TYPE_LOCK)
+                opener = br.registry.get(1, const.DEVICE_TYPE_OPENER)
+                events = []
+                br.events.subscribe(events.append)
+
+                fake.set_state(1, state=const.STATE_LOCK_UNLOCKED)
+                del fake.devices[(2, const.DEVICE_TYPE_LOCK)]
+                fake.add_device(3)
+                second = await br.refresh_devices()
+                return br, first, second, lock, opener, events
+
+    br, first, second, lock, opener, events = run(main())
+    assert len(first.added) == 3 and first.removed == []
+    assert isinstance(lock, NukiLock) and isinstance(opener, NukiOpener)
+
+    assert [dev.nuki_id for dev in second.added] == [3]
+    assert [dev.nuki_id for dev in second.removed] == [2]
+    # Same objects, only the changed fields applied
+    assert br.registry.get(1, const.DEVICE_TYPE_LOCK) is lock
+    assert br.registry.get(1, const.DEVICE_TYPE_OPENER) is opener
+    assert lock.state == const.STATE_LOCK_UNLOCKED
+    assert [(ev.device, set(ev.changes)) for ev in events] == [
+        (lock, {"state", "stateName"})
+    ]
+    assert (2, const.DEVICE_TYPE_LOCK) not in br.registry
+    assert len(br.registry) == 3
+
+
+def test_refresh_of_a_device_type_only_removes_that_type(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1)
+            fake.add_device(2, const.DEVICE_TYPE_OPENER)
+            async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+                await br.refresh_devices()
+                entries = [flatten_list_entry(e) for e in await br.list()]
+                locks = [e for e in entries if e[0]["deviceType"] == 0]
+                return br.registry.reconcile(locks, const.DEVICE_TYPE_LOCK), br
+
+    changes, br = run(main())
+    assert changes.removed == [] and len(br.registry) == 2
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from aionuki import NukiBridge
+from aionuki.exceptions import BridgeUnavailableException
+from aionuki.retry import CircuitBreaker, RetryPolicy, is_bridge_failure
+from aionuki.testing import FakeNukiBridge
+
+
+def _status(status):
+    return aiohttp.ClientResponseError(None, (), status=status)
+
+
+def test_bridge_failures():
+    assert is_bridge_failure(_status(503))
+    assert is_bridge_failure(asyncio.TimeoutError())
+    assert not is_bridge_failure(_status(401))
+    assert not is_bridge_failure(ValueError())
+
+
+def test_retry_policy():
+    policy = RetryPolicy(attempts=3, backoff=1, max_backoff=3, jitter=0)
+    # Not processed by the bridge, safe to send again
+    assert policy.should_retry(_status(503), 0, idempotent=False)
+    assert not policy.should_retry(_status(401), 0, idempotent=True)
+    # May have reached the bridge
+    assert policy.should_retry(asyncio.TimeoutError(), 0, idempotent=True)
+    assert not policy.should_retry(asyncio.TimeoutError(), 0, idempotent=False)
+    assert not policy.should_retry(_status(503), 2, idempotent=True)
+    assert [policy.delay(a) for a in range(4)] == [1, 2, 3, 3]
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == breaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow()
+    assert 0 < breaker.retry_in <= 0.05
+
+    time.sleep(0.06)
+    # A single trial request
+    assert breaker.allow()
+    assert breaker.state == breaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED and breaker.allow()
+
+
+def test_answered_trial_request_closes_the_breaker(run):
+    async def main():
+        async with FakeNukiBridge(error_rate=1) as fake:
+            async with NukiBridge(
+                fake.host,
+                fake.port,
+                token=fake.token,
+                read_retry=RetryPolicy(attempts=1),
+                breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05),
+            ) as br:
+                with pytest.raises(aiohttp.ClientResponseError):
+                    await br.list()
+                with pytest.raises(BridgeUnavailableException):
+                    await br.list()
+                fake.error_rate = 0
+                await asyncio.sleep(0.06)
+                # The trial request is answered, with a 401
+                br.token = "wrong-token"
+                with pytest.raises(aiohttp.ClientResponseError) as err:
+                    await br.list()
+                assert err.value.status == 401
+                br.token = fake.token
+                return await br.list(), br.breaker.state
+
+    devices, state = run(main())
+    assert devices == [] and state == CircuitBreaker.CLOSED
+
+
+def test_retries_busy_bridge(run):
+    async def main():
+        async with FakeNukiBridge(error_rate=0.5) as fake:
+            async with NukiBridge(
+                fake.host,
+                fake.port,
+                token=fake.token,
+                cache_ttls={"list": (0, 0)},
+                read_retry=RetryPolicy(attempts=50, backoff=0.001),
+                breaker=CircuitBreaker(failure_threshold=1000),
+            ) as br:
+                for _ in range(10):
+                    await br.list()
+                return fake.requests, fake.rejected
+
+    requests, rejected = run(main())
+    # Every 503 was sent again
+    assert requests == 10 + rejected
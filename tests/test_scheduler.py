@@ -0,0 +1,101 @@
+import asyncio
+
+from aionuki.scheduler import (
+    PRIORITY_ACTION,
+    PRIORITY_DEFAULT,
+    PRIORITY_POLL,
+    RequestScheduler,
+)
+
+
+async def _request(scheduler, name, order, priority=PRIORITY_DEFAULT, hold=0.01):
+    async with scheduler.slot(priority):
+        order.append(name)
+        await asyncio.sleep(hold)
+
+
+def test_waiting_requests_served_by_priority(run):
+    async def main():
+        scheduler = RequestScheduler()
+        order = []
+        tasks = [asyncio.ensure_future(_request(scheduler, "first", order))]
+        await asyncio.sleep(0)
+        for name, priority in (
+            ("poll", PRIORITY_POLL),
+            ("default", PRIORITY_DEFAULT),
+            ("action", PRIORITY_ACTION),
+            ("action 2", PRIORITY_ACTION),
+        ):
+            tasks.append(
+                asyncio.ensure_future(_request(scheduler, name, order, priority))
+            )
+        await asyncio.gather(*tasks)
+        return order
+
+    # Same priorities in arrival order
+    assert run(main()) == ["first", "action", "action 2", "default", "poll"]
+
+
+def test_concurrency(run):
+    async def main():
+        scheduler = RequestScheduler(concurrency=2)
+        peak = []
+
+        async def request():
+            async with scheduler.slot():
+                peak.append(scheduler.active)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[request() for _ in range(6)])
+        return max(peak), scheduler.active, scheduler.pending
+
+    assert run(main()) == (2, 0, 0)
+
+
+def test_min_interval_between_starts(run):
+    async def main():
+        scheduler = RequestScheduler(concurrency=3, min_interval=0.05)
+        loop = asyncio.get_event_loop()
+        starts = []
+
+        async def request():
+            async with scheduler.slot():
+                starts.append(loop.time())
+
+        await asyncio.gather(*[request() for _ in range(3)])
+        return [b - a for a, b in zip(starts, starts[1:])]
+
+    assert all(gap >= 0.045 for gap in run(main()))
+
+
+def test_cancelled_waiter_is_skipped(run):
+    async def main():
+        scheduler = RequestScheduler()
+        order = []
+        first = asyncio.ensure_future(_request(scheduler, "first", order, hold=0.05))
+        await asyncio.sleep(0)
+        cancelled = asyncio.ensure_future(_request(scheduler, "cancelled", order))
+        last = asyncio.ensure_future(_request(scheduler, "last", order))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(first, last)
+        return order, scheduler.active
+
+    assert run(main()) == (["first", "last"], 0)
+
+
+def test_cancelled_after_being_granted_hands_the_slot_over(run):
+    async def main():
+        scheduler = RequestScheduler()
+        order = []
+        await scheduler.acquire()
+        granted = asyncio.ensure_future(scheduler.acquire())
+        last = asyncio.ensure_future(_request(scheduler, "last", order))
+        await asyncio.sleep(0)
+        # The slot is granted to the waiter, which is cancelled before running
+        scheduler.release()
+        granted.cancel()
+        await asyncio.wait_for(last, 1)
+        return order, scheduler.active
+
+    assert run(main()) == (["last"], 0)
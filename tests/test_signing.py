@@ -0,0 +1,71 @@
+import hashlib
+
+from aionuki import NukiBridge
+from aionuki.signing import RequestBuilder
+from aionuki.testing import FakeNukiBridge
+
+# 2024-03-01T10:00:00Z
+NOW = 1709287200
+
+
+class Clock(object):
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _check_signature(url, token):
+    query = url.query
+    expected = hashlib.sha256(f"{query['ts']},{query['rnr']},{token}".encode())
+    assert query["hash"] == expected.hexdigest()
+    assert 0 <= int(query["rnr"]) < 2**16
+
+
+def test_signed_url():
+    builder = RequestBuilder("http://bridge:8080", "secret", clock=Clock(NOW + 0.7))
+    url = builder.url("lockAction", {"nukiId": 1, "action": 2})
+    assert str(url).startswith("http://bridge:8080/lockAction?ts=")
+    assert url.query["ts"] == "2024-03-01T10:00:00Z"
+    assert url.query["nukiId"] == "1" and url.query["action"] == "2"
+    _check_signature(url, "secret")
+
+
+def test_signatures_follow_the_clock():
+    clock = Clock()
+    builder = RequestBuilder("http://bridge:8080", "secret", clock=clock)
+    first = builder.url("info")
+    clock.now += 1
+    second = builder.url("info")
+    assert first.query["ts"] == "2024-03-01T10:00:00Z"
+    assert second.query["ts"] == "2024-03-01T10:00:01Z"
+    # The cached "{ts}," context isn't reused across seconds
+    _check_signature(first, "secret")
+    _check_signature(second, "secret")
+
+
+def test_plain_token_url():
+    builder = RequestBuilder("http://bridge:8080", "secret", secure=False)
+    url = builder.url("list")
+    assert str(url) == "http://bridge:8080/list?token=secret"
+
+
+def test_bridge_follows_token_and_secure_changes(run):
+    async def main():
+        async with FakeNukiBridge(token="first") as fake:
+            async with NukiBridge(
+                fake.host, fake.port, token="first", cache_ttls={"list": (0, 0)}
+            ) as br:
+                await br.list()
+                fake.token = br.token = "second"
+                url = br._request_builder().url("list")
+                await br.list()
+                br.secure = False
+                plain = br._request_builder().url("list")
+                await br.list()
+                return url, plain
+
+    url, plain = run(main())
+    _check_signature(url, "second")
+    assert plain.query["token"] == "second" and "hash" not in plain.query
@@ -0,0 +1,29 @@
+import time
+
+from aionuki.telemetry import RingBuffer, Series, Telemetry
+
+
+def test_drain_rate_from_recent_samples():
+    telemetry = Telemetry(("batteryChargeState",))
+    hour = time.time() // 3600 * 3600 - 3600
+    # One percent every 10 minutes, all within the same hour
+    for i in range(6):
+        telemetry.record({"batteryChargeState": 90 - i}, hour + i * 600)
+    assert round(telemetry.drain_rate(), 6) == 144
+
+
+def test_points_use_the_finest_covering_resolution():
+    series = Series()
+    for i in range(1000):
+        series.record(i, t=i * 10)
+    # Raw holds the last 128 samples only
+    assert series.points(since=9900) == [(t, t / 10) for t in range(9900, 10000, 10)]
+    # Older ones are averaged per minute
+    assert series.points(since=5000)[:2] == [(5040, 506.5), (5100, 512.5)]
+
+
+def test_ring_buffer_keeps_values_exactly():
+    buffer = RingBuffer(2)
+    for t, value in enumerate((1234567.891, -2.5, 1e-9)):
+        buffer.append(t, value)
+    assert list(buffer) == [(1, -2.5), (2, 1e-9)]
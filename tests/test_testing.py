@@ -0,0 +1,48 @@
+import asyncio
+
+from aionuki import NukiBridge, NukiCallbackServer
+from aionuki import constants as const
+from aionuki.testing import FakeNukiBridge
+
+
+async def _collect_states(fake, action, count):
+    """States pushed by the callbacks while fake runs action on device 1"""
+    async with NukiCallbackServer(host="127.0.0.1", port=0) as server:
+        async with NukiBridge(fake.host, fake.port, token=fake.token) as br:
+            await br.connect()
+            await server.register(br)
+            states = []
+            br.events.subscribe(lambda ev: states.append(ev.changes.get("state")))
+            await br.lock_action(1, action)
+            for _ in range(100):
+                await server.join()
+                if len(states) >= count:
+                    break
+                await asyncio.sleep(0.01)
+            return states
+
+
+def test_unlatch_goes_through_transitional_states(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1, state=const.STATE_LOCK_LOCKED)
+            return await _collect_states(fake, const.ACTION_LOCK_UNLATCH, 3)
+
+    assert run(main()) == [
+        const.STATE_LOCK_UNLATCHING,
+        const.STATE_LOCK_UNLATCHED,
+        const.STATE_LOCK_UNLOCKED,
+    ]
+
+
+def test_lock_n_go_ends_locked(run):
+    async def main():
+        async with FakeNukiBridge() as fake:
+            fake.add_device(1, state=const.STATE_LOCK_LOCKED)
+            states = await _collect_states(fake, const.ACTION_LOCK_LOCK_N_GO, 4)
+            return states, fake.devices[(1, const.DEVICE_TYPE_LOCK)]["state"]
+
+    states, final = run(main())
+    assert states[-1] == const.STATE_LOCK_LOCKED
+    assert const.STATE_LOCK_UNLOCKED_LOCK_N_GO in states
+    assert final["state"] == const.STATE_LOCK_LOCKED